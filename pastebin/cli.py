@@ -9,6 +9,15 @@ Options:
   -b --by=key       Set the sort key
      --latest=N     Only read the latest N (UNSEEN) messages
   -s --dry-run      No deletey
+     --incremental  Only read messages that arrived since the last run, by UID
+     --state=FILE   Where --incremental keeps its place [default: ~/.cache/pastebin_mailbox_state.json]
+     --batch-size=N  Fetch N messages per IMAP command [default: 50]
+  -j --workers=N    Fetch pastes in N threads [default: 8]
+     --per-host=N   Open at most N requests to a host at once [default: 4]
+     --rate=R       Start at most R requests per second
+     --paste-cache=FILE  Keep fetched pastes in FILE [default: ~/.cache/pastebin_pastes.sqlite]
+     --paste-ttl=N  Revalidate cached pastes older than N hours, instead of never
+     --paste-cache-mb=N  Evict least recently used pastes over N MiB [default: 256]
   -v --verbose      More output, use -vv or even more
 
 Output options:
@@ -29,15 +38,16 @@ import sys
 
 from docopt import docopt
 
-import pastebin.mailbox
-
-from url_sort.parser import *
-
+from .paste_cache import PasteCache
+from .sync_state import SyncState
 from .persistent_cache import TextArgMemo
 
 def main():
     import logging
     options = docopt(__doc__, version='1.0.0')
+    # slow imports, after --help has been handled
+    import pastebin.mailbox
+    from url_sort.parser import CACHE_DB, sort_urls
     verbose = options.pop('--verbose')
     if verbose:
         logging.basicConfig(level=logging.DEBUG if (1 < verbose) else logging.INFO)
@@ -49,6 +59,19 @@ def main():
         safe = options.pop('--dry-run')
         order = options.pop('--by')
         latest = options.pop('--latest')
+        batch_size = int(options.pop('--batch-size'))
+        incremental = options.pop('--incremental')
+        state_filename = options.pop('--state')
+        if incremental and latest:
+            print("--latest cannot be used with --incremental", file=sys.stderr)
+            return 2
+        fetch_options = { 'workers': int(options.pop('--workers')), \
+                          'per_host': int(options.pop('--per-host')), \
+                          'rate': float(options.pop('--rate') or 0) or None }
+        paste_cache_filename = options.pop('--paste-cache')
+        paste_ttl = options.pop('--paste-ttl')
+        paste_ttl = float(paste_ttl)*3600 if paste_ttl else None
+        paste_cache_bytes = int(options.pop('--paste-cache-mb'))<<20
         list_filename = options.pop('--list')
         text_filename = options.pop('--text')
         text_age = { 'hours': int(options.pop('--text-age')) }
@@ -60,7 +83,10 @@ def main():
         raise
     if not isinstance(m3u_age, timedelta):
         m3u_age = timedelta(**m3u_age)
-    nmatches, results = pastebin.mailbox.apply_filter(latest=latest, safe=safe, **creds)
+    with PasteCache(paste_cache_filename, ttl=paste_ttl, max_bytes=paste_cache_bytes) as paste_cache, \
+            SyncState(state_filename) as state:
+        nmatches, results = pastebin.mailbox.apply_filter(latest=latest, safe=safe, cache=paste_cache, batch_size=batch_size, \
+                state=state if incremental else None, **fetch_options, **creds)
     if not nmatches:
         print("Zero matches", file=sys.stdout)
         return 1
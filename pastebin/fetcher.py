@@ -0,0 +1,94 @@
+#! /usr/bin/env python3
+"""
+Fetching pastes in a pool of threads, each with its own requests.Session,
+with at most per_host requests open to any one host and, optionally, at
+most rate requests per second.
+"""
+import logging
+logger = logging.getLogger(__name__)
+debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger.error, logger.critical
+
+import collections
+import concurrent.futures
+import threading
+import time
+import urllib.parse
+
+import requests
+
+
+class TokenBucket:
+    """
+    Allows rate calls per second on average, and bursts of up to burst calls.
+    """
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = self.tokens = float(burst or max(1, rate))
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+    def take(self):
+        """
+        Blocks until a token is available
+        """
+        while True:
+            with self.lock:
+                t = self.clock()
+                self.tokens = min(self.burst, self.tokens+(t-self.updated)*self.rate)
+                self.updated = t
+                if 1 <= self.tokens:
+                    self.tokens -= 1
+                    return
+                wait = (1-self.tokens)/self.rate
+            time.sleep(wait)
+
+
+class PasteFetcher:
+    """
+    Use as a context manager. submit() returns a future of paste.fetch(),
+    and repeated paste keys share one future. cache is an open
+    paste_cache.PasteCache, passed to fetch().
+    """
+    def __init__(self, workers=8, per_host=4, rate=None, burst=None, cache=None):
+        self.cache = cache
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=int(workers), thread_name_prefix='fetch')
+        self.per_host = int(per_host)
+        self.host_limits = collections.defaultdict(lambda: threading.BoundedSemaphore(self.per_host))
+        self.host_lock = threading.Lock()
+        self.bucket = TokenBucket(float(rate), burst) if rate else None
+        self.local = threading.local()
+        self.sessions = []
+        self.futures = {}
+    def _session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+            self.sessions.append(session)
+        return session
+    def _fetch(self, paste):
+        if (self.cache is not None) and self.cache.is_fresh(paste.paste_key):
+            # no request, so no limits
+            return paste.fetch(cache=self.cache)
+        host = urllib.parse.urlsplit(paste.get_raw_url()).hostname
+        with self.host_lock:
+            limit = self.host_limits[host]
+        with limit:
+            if self.bucket:
+                self.bucket.take()
+            debug("Fetching %s", paste)
+            return paste.fetch(session=self._session(), cache=self.cache)
+    def submit(self, paste):
+        f = self.futures.get(paste.paste_key)
+        if f is None:
+            f = self.futures[paste.paste_key] = self.pool.submit(self._fetch, paste)
+        return f
+    def close(self):
+        self.pool.shutdown(wait=True)
+        for session in self.sessions:
+            session.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, e_type, e, traceback):
+        if e_type is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+        self.close()
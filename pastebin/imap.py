@@ -0,0 +1,210 @@
+#! /usr/bin/env python3
+"""
+Helpers for batched IMAP commands: message sets, and parsing FETCH responses
+as returned by imaplib.
+"""
+import logging
+logger = logging.getLogger(__name__)
+debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger.error, logger.critical
+
+import itertools
+import re
+
+
+def _ranges(numbers):
+    ranges = []
+    for n in sorted(set(int(n) for n in numbers)):
+        if ranges and (ranges[-1][1]+1 == n):
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return [ str(a) if (a == b) else '%d:%d' % (a, b) for a, b in ranges ]
+def message_set(numbers):
+    """
+    Returns an IMAP message set like '1:40,52' for message numbers or UIDs
+    """
+    return ','.join(_ranges(numbers))
+def message_sets(numbers, max_length=1000):
+    """
+    Yields message sets covering numbers, each at most about max_length
+    characters, to keep command lines within what servers accept
+    """
+    chunk, length = [], 0
+    for r in _ranges(numbers):
+        if chunk and (max_length < length+len(r)+1):
+            yield ','.join(chunk)
+            chunk, length = [], 0
+        chunk.append(r)
+        length += len(r)+1
+    if chunk:
+        yield ','.join(chunk)
+
+
+class Literal(bytes):
+    """
+    A {n} literal, told apart from atoms
+    """
+def _tokens(data, atom=re.compile(rb'[^\s()"\[\]{}]+(\[[^\]]*\](<[0-9.]+>)?)?'), \
+        literal=re.compile(rb'\{(\d+)\}$')):
+    """
+    Yields b'(', b')', atoms, quoted strings (as Literal), Literal values and
+    None for NIL, from imaplib's data: bytes, and (bytes, literal) tuples.
+    """
+    for item in data:
+        if isinstance(item, tuple):
+            text, value = item
+        else:
+            text, value = item, None
+        if value is not None:
+            text = literal.sub(b'', text.rstrip())
+        i, n = 0, len(text)
+        while i < n:
+            c = text[i:i+1]
+            if c.isspace():
+                i += 1
+            elif c in (b'(', b')'):
+                yield c
+                i += 1
+            elif c == b'"':
+                j, chars = i+1, []
+                while text[j:j+1] != b'"':
+                    if text[j:j+1] == b'\\':
+                        j += 1
+                    if n <= j:
+                        raise ValueError("Unterminated quoted string %r in IMAP response" % text[i:])
+                    chars.append(text[j:j+1])
+                    j += 1
+                yield Literal(b''.join(chars))
+                i = j+1
+            else:
+                m = atom.match(text, i)
+                if not m:
+                    raise ValueError("Unexpected %r in IMAP response" % text[i:])
+                a = m.group(0)
+                yield None if (a.upper() == b'NIL') else a
+                i = m.end()
+        if value is not None:
+            yield Literal(value)
+def parse_response(data):
+    """
+    Returns the top-level items of an IMAP response, with parenthesized lists
+    as Python lists
+    """
+    stack = [[]]
+    for t in _tokens(data):
+        if t == b'(' and not isinstance(t, Literal):
+            stack.append([])
+        elif t == b')' and not isinstance(t, Literal):
+            l = stack.pop()
+            stack[-1].append(l)
+        else:
+            stack[-1].append(t)
+    if len(stack) != 1:
+        raise ValueError("Unbalanced IMAP response")
+    return stack[0]
+def parse_fetch(data, by=None):
+    """
+    Returns { message number: { item name: value } } for the data of a FETCH,
+    item names upper-cased and partial-fetch origins dropped, like
+    b'BODY[2.MIME]'. Values of unsolicited responses are merged. With
+    by=b'UID', results of a UID FETCH are keyed by UID instead.
+    """
+    results, keys = {}, {}
+    items = parse_response(data)
+    for number, attributes in zip(items[::2], items[1::2]):
+        attributes = { re.sub(rb'<\d+>$', b'', bytes(k).upper()): v \
+                       for k, v in zip(attributes[::2], attributes[1::2]) }
+        if by is None:
+            key = int(number)
+        elif by in attributes:
+            key = keys[number] = int(attributes[by])
+        elif number in keys:
+            key = keys[number]
+        else:
+            debug("Ignoring FETCH response for %s without %s", number, by)
+            continue
+        results.setdefault(key, {}).update(attributes)
+    return results
+
+
+def find_parts(structure, type=b'text', subtype=b'html', prefix=''):
+    """
+    Returns the section numbers of parts of a BODYSTRUCTURE with the given
+    type, descending into multiparts and attached messages. A message that
+    is not multipart has only part '1'.
+    """
+    if structure and isinstance(structure[0], list): # multipart
+        sections = []
+        # the parts come first, then the subtype and any extension data, which
+        # has lists of its own
+        parts = itertools.takewhile(lambda s: isinstance(s, list), structure)
+        for i, part in enumerate(parts, start=1):
+            sections.extend(find_parts(part, type=type, subtype=subtype, prefix='%s%d.' % (prefix, i)))
+        return sections
+    section = prefix.rstrip('.') or '1'
+    t, st = (bytes(f or b'').lower() for f in structure[:2])
+    if (t, st) == (type, subtype):
+        return [section]
+    if (t, st) == (b'message', b'rfc822') and (9 <= len(structure)):
+        inner = structure[8]
+        if inner and isinstance(inner[0], list):
+            return find_parts(inner, type=type, subtype=subtype, prefix=section+'.')
+        return find_parts(inner, type=type, subtype=subtype, prefix=section+'.1.')
+    return []
+
+
+def _test():
+    """
+    Parses FETCH responses shaped like imaplib's data
+    """
+    assert message_set(['3', '1', '2', '52', '60', '61']) == '1:3,52,60:61'
+    assert list(message_sets(range(0, 40, 2), max_length=20)) == ['0,2,4,6,8,10,12,14', '16,18,20,22,24,26', '28,30,32,34,36,38']
+    # literals, quoted strings with escapes, NIL, and partial-fetch origins
+    data = [ (b'1 (FLAGS (\\Seen) BODY[HEADER] {12}', b'Subject: x\r\n'), \
+             (b' BODY[2]<0> {5}', b'hello'), \
+             b' X-NOTE "say \\"hi\\" \\\\ bye" X-NONE NIL)' ]
+    items = parse_fetch(data)[1]
+    assert items[b'FLAGS'] == [b'\\Seen']
+    assert items[b'BODY[HEADER]'] == b'Subject: x\r\n' and isinstance(items[b'BODY[HEADER]'], Literal)
+    assert items[b'BODY[2]'] == b'hello'
+    assert items[b'X-NOTE'] == b'say "hi" \\ bye'
+    assert items[b'X-NONE'] is None
+    for bad in ([b'1 (X "abc'], [b'1 (X "ab\\'], [b'1 (X (Y)']):
+        try:
+            parse_fetch(bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("%r parsed" % bad)
+    # UID FETCH responses are keyed by UID, also an unsolicited one without it
+    data = [ b'4 (UID 104 FLAGS ())', b'5 (UID 105 FLAGS ())', b'4 (FLAGS (\\Seen))' ]
+    assert sorted(parse_fetch(data, by=b'UID')) == [104, 105]
+    assert parse_fetch(data, by=b'UID')[104][b'FLAGS'] == [b'\\Seen']
+    # a single part
+    text_html = b'("text" "html" ("charset" "utf-8") NIL NIL "7bit" 120 4 NIL NIL NIL NIL)'
+    structure, = parse_fetch([b'1 (BODYSTRUCTURE ' + text_html + b')'])[1].values()
+    assert find_parts(structure) == ['1']
+    # multipart/alternative with extension data: parameters, disposition,
+    # language and location, which are not parts
+    alternative = b'(("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 40 2 NIL NIL NIL NIL)' + text_html + \
+            b' "alternative" ("boundary" "b1") ("inline" ("filename" "a")) ("en") "http://x")'
+    structure, = parse_fetch([b'1 (BODYSTRUCTURE ' + alternative + b')'])[1].values()
+    assert find_parts(structure) == ['2']
+    # an attached message/rfc822, with a multipart body, after a text part
+    envelope = b'("Mon, 1 Jan 2018 00:00:00 +0000" "inner" NIL NIL NIL NIL NIL NIL NIL NIL)'
+    attached = b'("message" "rfc822" NIL NIL NIL "7bit" 900 ' + envelope + b' ' + alternative + b' 30 NIL NIL NIL NIL)'
+    mixed = b'(("text" "plain" NIL NIL NIL "7bit" 10 1 NIL NIL NIL NIL)' + attached + b' "mixed" ("boundary" "b0") NIL NIL NIL)'
+    data = [ (b'7 (UID 107 BODYSTRUCTURE ' + mixed + b' BODY[1] {3}', b'abc'), b')' ]
+    items = parse_fetch(data, by=b'UID')[107]
+    assert find_parts(items[b'BODYSTRUCTURE']) == ['2.2']
+    assert items[b'BODY[1]'] == b'abc'
+    # an attached message whose body is one part
+    attached = b'("message" "rfc822" NIL NIL NIL "7bit" 900 ' + envelope + b' ' + text_html + b' 30)'
+    structure, = parse_fetch([b'1 (BODYSTRUCTURE (' + text_html + attached + b' "mixed"))'])[1].values()
+    assert find_parts(structure) == ['1', '2.1']
+    print("ok")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level='INFO')
+    _test()
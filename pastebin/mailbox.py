@@ -7,48 +7,149 @@ debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger
 import collections
 from datetime import datetime
 import imaplib
+import re
 import urllib.parse
 
-import requests
-
 from .util import *
-from .pastebin import parse_pastebin_alert
+from .fetcher import PasteFetcher
+from .imap import find_parts, message_set, message_sets, parse_fetch
+from .pastebin import parse_pastebin_alert, parse_pastebin_alert_parts
 
 
-def search_mailbox(host=None, mailbox=None, latest=None, **kwargs):
-    creds = kwargs
-    if latest:
-        latest = int(latest)
-        assert 0 < latest
-    with imaplib.IMAP4_SSL(host) as M:
-        M.login(**creds)
+def fetch_alerts(M, numbers, batch_size=50, uid=False):
+    """
+    Yields parsed alerts for message numbers, or UIDs if uid, in order,
+    batch_size messages at a time. Each batch takes one FETCH of
+    BODYSTRUCTURE, then one FETCH per distinct layout of text/html sections
+    in the batch, of only the header and those sections, without setting
+    \\Seen. Single-part messages, and those whose structure cannot be
+    walked, are fetched whole.
+    """
+    batch_size = int(batch_size)
+    if uid:
+        fetch = lambda mset, items: M.uid('FETCH', mset, items)
+    else:
+        fetch = M.fetch
+    by = b'UID' if uid else None
+    for start in range(0, len(numbers), batch_size):
+        batch = numbers[start:start+batch_size]
+        debug("Fetching messages %s", message_set(batch))
+        rv, data = fetch(message_set(batch), '(BODYSTRUCTURE)')
+        if rv != 'OK':
+            error("Fetching messages %s failed: %s", message_set(batch), data)
+            continue
+        structures = parse_fetch(data, by=by)
+        sections, groups = {}, collections.defaultdict(list)
+        for mn in batch:
+            structure = structures.get(int(mn), {}).get(b'BODYSTRUCTURE')
+            if structure is None:
+                continue
+            sections[mn] = None # the whole message, if small or unusual
+            if isinstance(structure[0], list): # multipart
+                try:
+                    sections[mn] = tuple(find_parts(structure))
+                except (TypeError, ValueError, IndexError) as e:
+                    warn("Fetching message %s whole, its BODYSTRUCTURE is unexpected: %s", mn, e)
+            groups[sections[mn]].append(mn)
+        fetched = {}
+        for group_sections, group in groups.items():
+            if group_sections is None:
+                items = [ 'BODY.PEEK[]' ]
+            else:
+                items = [ 'BODY.PEEK[HEADER]' ]
+                for s in group_sections:
+                    items.extend(['BODY.PEEK[%s.MIME]' % s, 'BODY.PEEK[%s]' % s])
+            rv, data = fetch(message_set(group), '(%s)' % ' '.join(items))
+            if rv == 'OK':
+                fetched.update(parse_fetch(data, by=by))
+        for mn in batch:
+            items = fetched.get(int(mn))
+            if not items:
+                error("Message %s disappeared", mn)
+                continue
+            if sections[mn] is None:
+                d = parse_pastebin_alert(items[b'BODY[]'])
+            else:
+                parts = [ (items.get(b'BODY[%s.MIME]' % s.encode()) or b'', \
+                           items.get(b'BODY[%s]' % s.encode()) or b'') \
+                          for s in sections[mn] ]
+                d = parse_pastebin_alert_parts(items[b'BODY[HEADER]'], parts)
+            d['message_number'] = mn
+            yield d
+
+
+def open_mailbox(host=None, user=None, password=None, mailbox=None, readonly=True):
+    """
+    Returns a logged-in IMAP4_SSL connection, with mailbox selected
+    """
+    M = imaplib.IMAP4_SSL(host)
+    try:
+        M.login(user, password)
         if mailbox:
-            rv, [mc_s] = M.select(mailbox=mailbox, readonly=True)
+            rv, [mc_s] = M.select(mailbox=mailbox, readonly=readonly)
             if rv:
                 mc = int(mc_s)
                 debug("%d messages", mc)
+    except:
+        M.logout()
+        raise
+    return M
+def get_uidvalidity(M, mailbox):
+    rv, data = M.response('UIDVALIDITY') # left by SELECT
+    if not (data and data[0]):
+        rv, data = M.status(mailbox, '(UIDVALIDITY)')
+        data = re.findall(rb'UIDVALIDITY (\d+)', data[0] or b'')
+    return int(data[0])
+def search_messages(M, latest=None, uid=False, after_uid=None):
+    """
+    Returns the numbers of UNSEEN messages, or their UIDs if uid, and with
+    after_uid only those of higher UIDs
+    """
+    if latest:
+        latest = int(latest)
+        assert 0 < latest
+    if uid:
+        if after_uid:
+            rv, [mset] = M.uid('SEARCH', None, '(UNSEEN UID %d:*)' % (after_uid+1))
+        else:
+            rv, [mset] = M.uid('SEARCH', None, '(UNSEEN)')
+    else:
         rv, [mset] = M.search(None, '(UNSEEN)')
-        mset = mset.decode().split()
-        if rv == 'OK':
-            if latest:
-                mset = sorted(mset, key=lambda s: -int(s))
-                mset = mset[:latest]
-            for mn in mset:
-                debug("Fetching message %s", mn)
-                rv, message_parts = M.fetch(mn, '(RFC822)')
-                if rv == 'OK':
-                    envelope, _ = message_parts
-                    part_num, content = envelope
-                    d = parse_pastebin_alert(content)
-                    d['message_number'] = mn
-                    yield d
-                else:
-                    error("Message %s disappeared", mn)
+    mset = (mset or b'').decode().split()
+    if after_uid:
+        # n:* matches the highest UID even when it is below n
+        mset = [ s for s in mset if after_uid < int(s) ]
+    if rv == 'OK':
+        if latest:
+            mset = sorted(mset, key=lambda s: -int(s))
+            mset = mset[:latest]
+        return mset
+    warn('No messages in search')
+    return []
+def search_mailbox(M, latest=None, batch_size=50, uid=False, after_uid=None):
+    """
+    Yields alerts of the messages of search_messages(). If uid,
+    message_number is a UID.
+    """
+    numbers = search_messages(M, latest=latest, uid=uid, after_uid=after_uid)
+    yield from fetch_alerts(M, numbers, batch_size=batch_size, uid=uid)
+def store_flags(M, numbers, flags, command='+FLAGS', uid=False):
+    """
+    Sets flags on message numbers, or UIDs if uid, in as few STORE commands
+    as the lengths of their message sets allow
+    """
+    for mset in message_sets(numbers):
+        debug("STORE %s %s %s", mset, command, flags)
+        if uid:
+            rv, data = M.uid('STORE', mset, command, flags)
         else:
-            warn('No messages in search')
+            rv, data = M.store(mset, command, flags)
+        if rv != 'OK':
+            error("STORE %s %s %s failed: %s", mset, command, flags, data)
 
 
-def apply_filter(key=None, safe=False, **kwargs):
+def apply_filter(key=None, safe=False, latest=None, workers=8, per_host=4, rate=None, cache=None, batch_size=50, \
+        state=None, **kwargs):
     payload = None
     if key is None:
         payload = DefaultFilter()
@@ -64,60 +165,105 @@ def apply_filter(key=None, safe=False, **kwargs):
             lines       an iterable of strings
             keyword     usually the original search term
             paste_key   pastebin id
+
+        Pastes are fetched by workers threads, at most per_host at a time
+        from one host and, if rate is given, rate per second. key is still
+        called in message order, as each message's pastes arrive. cache is
+        an open paste_cache.PasteCache. Messages are fetched batch_size at
+        a time.
+
+        One IMAP session, opened read-only if safe, serves the search,
+        fetch and flag updates. If safe, no flags are changed.
+
+        state is an open sync_state.SyncState, for an incremental refresh:
+        messages are then addressed by UID, and only those above the highest
+        UID processed last time are read. If the mailbox's UIDVALIDITY has
+        changed, the recorded UID means nothing, and all UNSEEN messages are
+        read again. The state only moves up to the highest UID below which
+        every message found was processed, so messages that failed to fetch
+        are read again next time. A safe run does not move the state forward.
+        latest cannot be combined with state, since the messages it skips
+        would be skipped for good.
     """
     tri = lambda v: { False: -1, None: 0, True: 1}[bool(v)]
     unit = "message"
 
     nmatches = 0
     to_seen, to_deleted = set(), set()
-    with requests.Session() as session:
-        for pastebin_message in progress(search_mailbox(**kwargs), unit=unit, desc="searching"):
-            message_number = pastebin_message.pop('message_number')
-            # Move key-values from the attrs list into the dict object
-            # If multiple keywords exist (unlikely) only one will survive!
-            attrs = dict(pastebin_message.pop('attrs'))
-            pastebin_message.update(attrs)
-            #
-            pastes = pastebin_message.pop('links')
-            message_result = False
-            for paste in pastes:
-                lines = paste.fetch(session=session)
-                if not lines:
-                    info("%s returned empty", paste)
-                    continue
-                result = key(lines=lines, \
-                        paste_key=paste.paste_key, **pastebin_message)
-                if result:
-                    nmatches += 1
-                    info("%s matches %s", paste, result)
-                message_result = max(message_result, result, key=tri)
-            if message_result:
-                to_seen.add(message_number)
-            elif message_result is None:
-                debug("Ignoring message number %s", message_number)
-            elif message_result is False:
-                debug("Marking message number %s (%s) for deletion", message_number, pastebin_message['date'])
-                to_deleted.add(message_number)
-    creds = kwargs
-    if to_deleted or to_seen:
-        mailbox = creds.pop('mailbox', None)
-        with imaplib.IMAP4_SSL(creds.pop('host')) as M:
-            M.login(creds.pop('user'), creds.pop('password'))
-            if mailbox:
-                rv, [mc_s] = M.select(mailbox=mailbox, readonly=bool(safe))
-                if rv:
-                    mc = int(mc_s)
-                    debug("%d messages", mc)
+    def apply_key(message_number, pastebin_message, fetches):
+        nonlocal nmatches
+        message_result = False
+        for paste, fetch in fetches:
+            lines = fetch.result()
+            if not lines:
+                info("%s returned empty", paste)
+                continue
+            result = key(lines=lines, \
+                    paste_key=paste.paste_key, **pastebin_message)
+            if result:
+                nmatches += 1
+                info("%s matches %s", paste, result)
+            message_result = max(message_result, result, key=tri)
+        if message_result:
+            to_seen.add(message_number)
+        elif message_result is None:
+            debug("Ignoring message number %s", message_number)
+        elif message_result is False:
+            debug("Marking message number %s (%s) for deletion", message_number, pastebin_message['date'])
+            to_deleted.add(message_number)
+    uid, after_uid, last_uid = state is not None, None, 0
+    if uid and latest:
+        raise ValueError("latest cannot be used with an incremental state")
+    with open_mailbox(readonly=bool(safe), **kwargs) as M:
+        if uid:
+            mailbox = kwargs.get('mailbox') or 'INBOX'
+            state_key = '%s@%s/%s' % (kwargs.get('user'), kwargs.get('host'), mailbox)
+            uidvalidity = get_uidvalidity(M, mailbox)
+            last = state.get(state_key)
+            if last is None:
+                info("No state for %s, reading all UNSEEN messages", state_key)
+            elif last[0] != uidvalidity:
+                warn("UIDVALIDITY of %s changed from %s to %s, reading all UNSEEN messages", state_key, last[0], uidvalidity)
+            else:
+                after_uid = last_uid = last[1]
+                info("Reading messages of %s after UID %d", state_key, after_uid)
+        with PasteFetcher(workers=workers, per_host=per_host, rate=rate, cache=cache) as fetcher:
+            lookahead = 4*int(workers) # messages whose pastes are fetched ahead
+            window = collections.deque()
+            numbers = search_messages(M, latest=latest, uid=uid, after_uid=after_uid)
+            processed = set()
+            alerts = fetch_alerts(M, numbers, batch_size=batch_size, uid=uid)
+            for pastebin_message in progress(alerts, unit=unit, desc="searching"):
+                message_number = pastebin_message.pop('message_number')
+                processed.add(message_number)
+                # Move key-values from the attrs list into the dict object
+                # If multiple keywords exist (unlikely) only one will survive!
+                attrs = dict(pastebin_message.pop('attrs'))
+                pastebin_message.update(attrs)
+                #
+                pastes = pastebin_message.pop('links')
+                fetches = [ (paste, fetcher.submit(paste)) for paste in pastes ]
+                window.append((message_number, pastebin_message, fetches))
+                if lookahead < len(window):
+                    apply_key(*window.popleft())
+            while window:
+                apply_key(*window.popleft())
+        if safe:
+            info("Dry run: not deleting %d or marking read %d messages", len(to_deleted), len(to_seen))
+        else:
             if to_deleted:
                 info("Deleting %s messages", len(to_deleted))
-                for mn in progress(sorted(to_deleted, key=int), unit=unit, desc="deleting"):
-                    debug("Deleting %s", mn)
-                    M.store(mn, '+FLAGS', '\\DELETED')
+                store_flags(M, to_deleted, '\\DELETED', uid=uid)
             if to_seen:
                 info("Marking %d messages read", len(to_seen))
-                for mn in progress(sorted(to_seen, key=int), unit=unit, desc="marking read"):
-                    debug("Marking %s SEEN", mn)
-                    M.store(mn, '+FLAGS', '\\SEEN')
+                store_flags(M, to_seen, '\\SEEN', uid=uid)
+            if uid:
+                for n in sorted(numbers, key=int):
+                    if n not in processed:
+                        warn("Message UID %s was not processed, and will be read again", n)
+                        break
+                    last_uid = int(n)
+                state.set(state_key, uidvalidity, last_uid)
     return nmatches, payload
 
 
@@ -0,0 +1,211 @@
+#! /usr/bin/env python3
+"""
+On-disk cache of paste bodies, keyed by paste_key.
+
+Bodies are stored zlib-compressed in SQLite, with the ETag and Last-Modified
+headers they came with. Pastes do not change once posted, so by default
+entries never expire and a cached paste is never requested again. With a
+ttl, older entries are revalidated with a conditional request, and a 304
+answer only renews them.
+
+Once the compressed bodies add up to more than max_bytes, the least recently
+used are evicted. Access times are written in batches, so that hits cost no
+writes.
+
+Run this module to exercise it against a local HTTP stand-in for pastebin.
+"""
+import logging
+logger = logging.getLogger(__name__)
+debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger.error, logger.critical
+
+import collections
+import os, os.path
+import sqlite3
+import threading
+import time
+import zlib
+
+
+PASTE_CACHE = '~/.cache/pastebin_pastes.sqlite'
+
+
+class CachedPaste(collections.namedtuple('CachedPaste', 'text etag last_modified fetched')):
+    def is_fresh(self, ttl=None, now=time.time):
+        return (ttl is None) or (now() < self.fetched+ttl)
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class PasteCache:
+    """
+    ttl is in seconds, None for never. Safe to share between threads.
+    Access times of up to flush_every hits are held in memory.
+    """
+    def __init__(self, filename=PASTE_CACHE, ttl=None, max_bytes=256<<20, timeout=60, flush_every=256):
+        self.filename = filename = os.path.expanduser(filename)
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self.accessed = {} # key: time, not yet written
+        self.lock = threading.Lock()
+        self.stats = collections.Counter(hits=0, misses=0, stale=0, revalidated=0, evicted=0)
+        self.db = sqlite3.connect(filename, timeout=timeout, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        with self.db:
+            self.db.execute('''CREATE TABLE IF NOT EXISTS pastes (key TEXT PRIMARY KEY, body BLOB NOT NULL,
+                etag TEXT, last_modified TEXT, fetched REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL)''')
+            self.db.execute('CREATE INDEX IF NOT EXISTS pastes_accessed ON pastes (accessed)')
+            self._evict()
+    def get(self, key):
+        """
+        Returns a CachedPaste, fresh or not, or None
+        """
+        with self.lock:
+            row = self.db.execute('SELECT body, etag, last_modified, fetched FROM pastes WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            body, etag, last_modified, fetched = row
+            self.stats['hits' if ((self.ttl is None) or (time.time() < fetched+self.ttl)) else 'stale'] += 1
+            self.accessed[key] = time.time()
+            if self.flush_every <= len(self.accessed):
+                self._flush_accessed()
+        return CachedPaste(zlib.decompress(body).decode('utf-8'), etag, last_modified, fetched)
+    def is_fresh(self, key):
+        """
+        True if key is cached and needs no request, without reading it
+        """
+        with self.lock:
+            row = self.db.execute('SELECT fetched FROM pastes WHERE key = ?', (key,)).fetchone()
+        return (row is not None) and ((self.ttl is None) or (time.time() < row[0]+self.ttl))
+    def put(self, key, text, etag=None, last_modified=None):
+        body = zlib.compress(text.encode('utf-8'), 9)
+        t = time.time()
+        with self.lock:
+            self.accessed.pop(key, None)
+            self._flush_accessed() # so that eviction sees them
+            with self.db:
+                self.db.execute('INSERT OR REPLACE INTO pastes (key, body, etag, last_modified, fetched, accessed, size) VALUES (?, ?, ?, ?, ?, ?, ?)', \
+                        (key, body, etag, last_modified, t, t, len(body)))
+                self._evict()
+    def renew(self, key):
+        """
+        Marks an entry fetched now, after the server answered 304
+        """
+        t = time.time()
+        with self.lock:
+            self.accessed.pop(key, None)
+            with self.db:
+                self.db.execute('UPDATE pastes SET fetched = ?, accessed = ? WHERE key = ?', (t, t, key))
+            self.stats['revalidated'] += 1
+    def _flush_accessed(self):
+        """
+        Writes held access times. Call with the lock held.
+        """
+        if self.accessed:
+            with self.db:
+                self.db.executemany('UPDATE pastes SET accessed = ? WHERE key = ?', \
+                        [ (t, key) for key, t in self.accessed.items() ])
+            self.accessed.clear()
+    def _evict(self):
+        """
+        Call with the lock held, in a transaction
+        """
+        (total,), = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM pastes')
+        if total <= self.max_bytes:
+            return
+        # down to 90%, so that eviction is not run on every put
+        excess = total-self.max_bytes*9//10
+        keys = []
+        for key, size in self.db.execute('SELECT key, size FROM pastes ORDER BY accessed'):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.db.executemany('DELETE FROM pastes WHERE key = ?', keys)
+        self.stats['evicted'] += len(keys)
+        debug("Evicted %d pastes from '%s'", len(keys), self.filename)
+    def __len__(self):
+        with self.lock:
+            (n,), = self.db.execute('SELECT COUNT(*) FROM pastes')
+        return n
+    def close(self):
+        with self.lock:
+            self._flush_accessed()
+            self.db.close()
+        info("Paste cache: %s", dict(self.stats))
+    def __enter__(self):
+        return self
+    def __exit__(self, e_type, e, traceback):
+        self.close()
+
+
+def _test():
+    """
+    Serves pastes from a local stand-in for pastebin.com, with ETags and 304
+    answers, and checks which fetches reach it
+    """
+    import http.server
+    import tempfile
+    import urllib.parse
+    import requests
+    from .pastebin import PastebinPaste
+
+    requested = []
+    class StandIn(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            key = self.path.rsplit('/', 1)[-1]
+            requested.append((key, self.headers.get('If-None-Match')))
+            etag = '"%s-v1"' % key
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = ('paste %s\n' % key + 'x'*4000+'\n').encode()
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', 'Mon, 01 Jan 2018 00:00:00 GMT')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, *args):
+            pass
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    class LocalPaste(PastebinPaste):
+        def get_raw_url(self):
+            return 'http://127.0.0.1:%d/raw/%s' % (server.server_address[1], self.paste_key)
+    def fetch_all(cache, keys):
+        del requested[:]
+        for k in keys:
+            lines = LocalPaste(urllib.parse.urlsplit('/'+k)).fetch(session=session, contents_memo={}, cache=cache)
+            assert lines[0] == 'paste '+k, lines
+        return list(requested)
+    with tempfile.TemporaryDirectory() as tempdir, requests.Session() as session:
+        filename = os.path.join(tempdir, 'pastes.sqlite')
+        keys = [ 'key%d' % i for i in range(20) ]
+        with PasteCache(filename) as cache:
+            assert len(fetch_all(cache, keys)) == 20
+        with PasteCache(filename) as cache:
+            assert fetch_all(cache, keys) == [], "cached pastes were requested again"
+            assert cache.stats['hits'] == 20
+        with PasteCache(filename, ttl=0) as cache:
+            assert fetch_all(cache, keys) == [ (k, '"%s-v1"' % k) for k in keys ], "stale pastes not revalidated"
+            assert cache.stats['revalidated'] == 20
+        with PasteCache(filename, max_bytes=200) as cache:
+            fetch_all(cache, keys)
+            assert len(cache) < 20 and cache.stats['evicted']
+            print(len(cache), "pastes kept under", cache.max_bytes, "bytes")
+    server.shutdown()
+    print("ok")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level='INFO')
+    _test()
@@ -28,15 +28,34 @@ class PastebinPaste:
         return urllib.parse.urlunsplit(('https', 'pastebin.com', self.paste_key, None, None))
     def get_raw_url(self):
         return urllib.parse.urlunsplit(('https', 'pastebin.com', 'raw/'+self.paste_key, None, None))
-    def fetch(self, session=None, contents_memo={}):
+    def fetch(self, session=None, contents_memo={}, cache=None):
+        """
+        cache is an open paste_cache.PasteCache. Fresh entries are returned
+        without a request, and stale ones are revalidated.
+        """
         if self.paste_key in contents_memo:
             return contents_memo[self.paste_key]
         url = self.get_raw_url()
+        headers = {}
+        if cache is not None:
+            cached = cache.get(self.paste_key)
+            if cached:
+                if cached.is_fresh(cache.ttl):
+                    lines = contents_memo[self.paste_key] = cached.text.splitlines()
+                    return lines
+                headers = cached.conditional_headers()
         if session:
-            req = session.get(url)
+            req = session.get(url, headers=headers)
         else:
-            req = requests.get(url)
+            req = requests.get(url, headers=headers)
+        if (req.status_code == 304) and headers:
+            cache.renew(self.paste_key)
+            lines = contents_memo[self.paste_key] = cached.text.splitlines()
+            return lines
         if req.ok:
+            if cache is not None:
+                cache.put(self.paste_key, req.text, \
+                        etag=req.headers.get('ETag'), last_modified=req.headers.get('Last-Modified'))
             lines = contents_memo[self.paste_key] = req.text.splitlines()
             return lines
 
@@ -60,7 +79,7 @@ class PastebinAlertParser(html.parser.HTMLParser):
             debug("Ignoring %s %s", tag, attrs)
 
 
-def parse_pastebin_alert(content, parser=email.parser.BytesParser()):
+def _parse_alert(m, u, html_payloads):
     def parse_subject_line(text):
         tokens = text.split(',')
         assert tokens.pop(0).strip() == 'Pastebin.com Alerts Notification'
@@ -70,13 +89,26 @@ def parse_pastebin_alert(content, parser=email.parser.BytesParser()):
             else:
                 k, v = t, True
             yield k.strip(), v.strip()
-    m, u = parse_email_message(content)
     p = PastebinAlertParser()
+    for payload in html_payloads:
+        p.feed(payload)
+    return { 'links': p.links, 'date': u['date'], \
+             'attrs': list(parse_subject_line(m['subject'])) }
+def parse_pastebin_alert(content):
+    m, u = parse_email_message(content)
+    html_payloads = []
     for part in m.walk():
         ct = part.get_content_type()
         if ct == 'text/html':
-            p.feed(part.get_payload())
+            html_payloads.append(part.get_payload())
         else:
             debug("Ignoring content type %s", ct)
-    return { 'links': p.links, 'date': u['date'], \
-             'attrs': list(parse_subject_line(m['subject'])) }
+    return _parse_alert(m, u, html_payloads)
+def parse_pastebin_alert_parts(header, html_parts=(), parser=email.parser.BytesParser()):
+    """
+    Like parse_pastebin_alert, from a partial FETCH: the message header, and
+    (MIME header, body) of each text/html part
+    """
+    m, u = parse_email_message(header)
+    html_payloads = [ parser.parsebytes(mime+body).get_payload() for mime, body in html_parts ]
+    return _parse_alert(m, u, html_payloads)
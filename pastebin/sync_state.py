@@ -0,0 +1,56 @@
+#! /usr/bin/env python3
+"""
+Where incremental mailbox refreshes left off: per mailbox, its UIDVALIDITY
+and the highest UID processed, kept in a small JSON file.
+"""
+import logging
+logger = logging.getLogger(__name__)
+debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger.error, logger.critical
+
+import json
+import os, os.path
+import tempfile
+
+
+SYNC_STATE = '~/.cache/pastebin_mailbox_state.json'
+
+
+class SyncState:
+    """
+    Use as a context manager; changes are written on a clean exit.
+    """
+    def __init__(self, filename=SYNC_STATE):
+        self.filename = filename = os.path.expanduser(filename)
+        self.mailboxes = {}
+        self.changed = False
+        if os.path.exists(filename):
+            try:
+                with open(filename) as fi:
+                    self.mailboxes = json.load(fi)
+            except ValueError:
+                warn("Ignoring unreadable state file '%s'", filename)
+    def get(self, key):
+        """
+        Returns (uidvalidity, last_uid), or None for a mailbox not seen before
+        """
+        d = self.mailboxes.get(key)
+        if d:
+            return d['uidvalidity'], d['last_uid']
+    def set(self, key, uidvalidity, last_uid):
+        self.mailboxes[key] = { 'uidvalidity': int(uidvalidity), 'last_uid': int(last_uid) }
+        self.changed = True
+    def save(self):
+        if not self.changed:
+            return
+        dirname = os.path.dirname(self.filename) or '.'
+        os.makedirs(dirname, exist_ok=True)
+        # replaced atomically, so an interrupted run leaves the old state
+        with tempfile.NamedTemporaryFile('w', dir=dirname, delete=False) as fo:
+            json.dump(self.mailboxes, fo, indent=2, sort_keys=True)
+        os.replace(fo.name, self.filename)
+        self.changed = False
+    def __enter__(self):
+        return self
+    def __exit__(self, e_type, e, traceback):
+        if e_type is None:
+            self.save()
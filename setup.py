@@ -12,8 +12,10 @@ setup(name='UrlSort',
           'console_scripts': [
               'pastebin_mailbox_refresh=pastebin.cli:main',
               'urlsort=url_sort.cli:main',
+              'urlsort_benchmark=url_sort.benchmark.__main__:main',
               ],
       },
       install_requires = [ 'docopt', 'requests', 'tqdm' ],
+      extras_require = { 'numpy': [ 'numpy' ] },
       zip_safe=True
      )
@@ -1,3 +1,8 @@
-from .parser import sort_urls
+def __getattr__(name):
+    # importing url_sort.parser loads the search config, so wait until needed
+    if name == 'sort_urls':
+        from .parser import sort_urls
+        return sort_urls
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
@@ -0,0 +1,8 @@
+"""
+Benchmarks for url_sort, over synthetic corpora from .corpus
+
+Like urlsort itself, run from the directory holding the search config:
+  urlsort_benchmark --help
+or
+  python -m url_sort.benchmark --help
+"""
@@ -0,0 +1,225 @@
+#! /usr/bin/env python3
+"""Benchmark url_sort stages over a synthetic corpus.
+
+Usage:
+  urlsort_benchmark [ -v ] [options] [STAGE ...]
+
+Options:
+  -h --help          This help
+  -n --size=N        Lines in the synthetic corpus, like 10k or 2M [default: 10k]
+     --seed=N        Corpus random seed [default: 0]
+     --corpus=FILE   Only write the corpus to FILE
+     --check         Only compare optimized functions to their reference
+                     implementations over the corpus
+     --startup       Only time 'urlsort --help' and sorting 10 lines in fresh
+                     processes, failing if either takes over --budget
+     --budget=SECONDS  Startup time allowed [default: 0.5]
+     --save=FILE     Save results as a JSON baseline
+     --compare=FILE  Compare against a saved baseline
+     --tolerance=X   Slowdown counted as a regression [default: 0.10]
+     --no-memory     Skip measuring peak memory, which repeats each stage
+  -v --verbose      More output
+
+Stages default to all of them. Run from the directory holding the search
+config, as for urlsort.
+"""
+import logging
+logger = logging.getLogger(__name__)
+debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger.error, logger.critical
+
+import gc
+import json
+import operator
+import os, os.path
+import platform
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from docopt import docopt
+
+from . import checks, corpus, startup
+from .. import parser
+from ..parser import *
+
+
+def parse_size(text, suffixes={ 'k': 10**3, 'm': 10**6 }):
+    text = text.strip().lower()
+    if text[-1:] in suffixes:
+        return int(float(text[:-1])*suffixes[text[-1]])
+    return int(text)
+
+
+def _split_words(lines):
+    words = []
+    for line in lines:
+        wgs, _ = splitter(parse_url(line).filepart)
+        words.extend(re.split('[^a-zA-Z0-9,!?]+', wg) for wg in wgs)
+    return words
+
+
+# Each stage takes the corpus lines and returns (n, run), where run() is timed
+def stage_splitter(lines):
+    fileparts = [ parse_url(line).filepart for line in lines ]
+    return len(fileparts), lambda: [ splitter(f) for f in fileparts ]
+def stage_get_date_tag(lines):
+    splitted = [ splitter(parse_url(line).filepart)[0] for line in lines ]
+    def run():
+        parse_date.cache_clear()
+        return [ get_date_tag(list(s)) for s in splitted ]
+    return len(splitted), run
+def stage_tokenize(lines):
+    urls = [ parse_url(line) for line in lines ]
+    def run():
+        parse_date.cache_clear()
+        return [ u.tokenize() for u in urls ]
+    return len(urls), run
+def stage_replace_terms(lines):
+    words = _split_words(lines)
+    rankers = config.resolutions, config.tag_terms, config.search_terms
+    def run():
+        for w in words:
+            for r in rankers:
+                r.replace_terms(w)
+    return len(words), run
+def stage_groupby(lines):
+    rows = []
+    for order, line in enumerate(lines, start=1):
+        u = parse_url(line)
+        u.order = order
+        rows.append((token_key(u), u))
+    return len(rows), lambda: groupby(rows, key=operator.itemgetter(0), sort=False)
+def make_stage_sort_urls(order):
+    def stage_sort_urls(lines):
+        fd, filename = tempfile.mkstemp(suffix='.list')
+        with os.fdopen(fd, 'w') as fo:
+            fo.write('\n'.join(lines))
+        def run():
+            parse_date.cache_clear()
+            cache_dir = tempfile.mkdtemp()
+            parser.CACHE_DB = os.path.join(cache_dir, 'urlsort.sqlite')
+            try:
+                with open(filename) as fi:
+                    return list(sort_urls(fi, order=order))
+            finally:
+                for fn in os.listdir(cache_dir):
+                    os.remove(os.path.join(cache_dir, fn))
+                os.rmdir(cache_dir)
+                parser.CACHE_DB = CACHE_DB
+        run.cleanup = lambda: os.remove(filename)
+        return len(lines), run
+    return stage_sort_urls
+stages = { 'splitter': stage_splitter,
+    'get_date_tag': stage_get_date_tag,
+    'tokenize': stage_tokenize,
+    'replace_terms': stage_replace_terms,
+    'groupby': stage_groupby }
+stages.update(('sort_urls:%s' % k, make_stage_sort_urls(k)) for k in sort_keys if k)
+
+
+def measure(stage, lines, memory=True):
+    n, run = stage(lines)
+    gc.collect()
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter()-start
+    result = { 'n': n, 'seconds': elapsed, 'per_second': n/elapsed if elapsed else None }
+    if hasattr(run, 'cleanup'):
+        run.cleanup()
+    if memory:
+        n, run = stage(lines)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result['peak_bytes'] = peak
+        if hasattr(run, 'cleanup'):
+            run.cleanup()
+    return result
+
+
+def compare(results, baseline, tolerance=0.10):
+    """
+    Yields (stage, ratio, regressed) for stages in both, ratio being new time over old
+    """
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b and b['seconds']:
+            # normalize by size, in case the corpora differ
+            ratio = (r['seconds']/r['n']) / (b['seconds']/b['n'])
+            yield name, ratio, (1+tolerance < ratio)
+
+
+def main():
+    options = docopt(__doc__)
+    if options.pop('--verbose'):
+        logging.basicConfig(level=logging.INFO)
+    size = parse_size(options.pop('--size'))
+    seed = int(options.pop('--seed'))
+    corpus_filename = options.pop('--corpus')
+    if corpus_filename:
+        corpus.write_corpus(corpus_filename, size, seed=seed)
+        return 0
+    if options.pop('--check'):
+        lines = list(corpus.generate(size, seed=seed))
+        rc = 0
+        for name, check in checks.checks.items():
+            differences = list(check(lines))
+            print("%s: %d differences" % (name, len(differences)))
+            for args in differences[:20]:
+                print('\t'+'\n\t\t'.join(repr(a) for a in args))
+            if differences:
+                rc = 1
+        return rc
+    if options.pop('--startup'):
+        budget = float(options.pop('--budget'))
+        lines = list(corpus.generate(10, seed=seed))
+        rc = 0
+        print("%-28s %10s  %s" % ('command', 'seconds', 'slow modules imported'))
+        for name, (args, input) in startup.get_commands(lines).items():
+            r = startup.measure(args, input=input)
+            over = budget < r['seconds']
+            print("%-28s %10.3f  %s%s" % (name, r['seconds'], ' '.join(r['slow_modules']) or '-', \
+                    '  OVER BUDGET' if over else ''))
+            if over:
+                rc = 1
+        return rc
+    names = options.pop('STAGE') or list(stages)
+    for name in names:
+        if name not in stages:
+            print("Unknown stage '%s', choose from: %s" % (name, ' '.join(stages)), file=sys.stderr)
+            return 2
+    memory = not options.pop('--no-memory')
+    info("Generating %d lines", size)
+    lines = list(corpus.generate(size, seed=seed))
+    results = {}
+    print("%-28s %10s %10s %12s %10s" % ('stage', 'n', 'seconds', 'per second', 'peak MiB'))
+    for name in names:
+        r = results[name] = measure(stages[name], lines, memory=memory)
+        print("%-28s %10d %10.3f %12.0f %10s" % (name, r['n'], r['seconds'], r['per_second'] or 0, \
+                ('%.1f' % (r['peak_bytes']/(1<<20))) if memory else '-'))
+    rc = 0
+    baseline_filename = options.pop('--compare')
+    if baseline_filename:
+        with open(baseline_filename) as fi:
+            baseline = json.load(fi)
+        print("\nCompared to %s (size %d):" % (baseline_filename, baseline['size']))
+        for name, ratio, regressed in compare(results, baseline['stages'], float(options.pop('--tolerance'))):
+            print("%-28s %6.2fx %s" % (name, ratio, 'REGRESSION' if regressed else ''))
+            if regressed:
+                rc = 1
+    save_filename = options.pop('--save')
+    if save_filename:
+        with open(save_filename, 'w') as fo:
+            json.dump({ 'size': size, 'seed': seed, 'python': platform.python_version(), \
+                        'time': time.time(), 'stages': results }, fo, indent=2)
+    return rc
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+#! /usr/bin/env python3
+"""
+Differential checks of optimized functions against their reference
+implementations, over corpus lines.
+"""
+from ..parser import parse_url
+from ..util import *
+
+
+# Some inputs the synthetic corpus does not produce
+extra_fileparts = [ '', '...', 'Amélie.2001.1080p', 'Élève_DD5.1_AAC2.0', '日本.mp4.2017',
+    'movie (2019) [x264]', "`quoted' title.XviD", 'the.ULTRA.HD.REMUX.mkv', 'lower.case.MP4.AVI.MKV.x',
+    'Title.Ultra-HD-TS.H264', 'ZAAC-HD.HD-MP4', '2017.05.12.1080p', 'name_720_p_', '((nested) [brackets])' ]
+
+
+def check_splitter(lines):
+    """
+    Yields (filepart, reference result, splitter result) for each difference
+    """
+    fileparts = [ parse_url(line).filepart for line in lines ]
+    for f in fileparts+extra_fileparts:
+        expected, actual = reference_splitter(f), splitter(f)
+        if expected != actual:
+            yield f, expected, actual
+
+
+checks = { 'splitter': check_splitter }
@@ -0,0 +1,99 @@
+#! /usr/bin/env python3
+"""
+Synthetic URL corpora resembling filename-style download lists.
+"""
+import random
+import urllib.parse
+
+
+title_words = '''alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima
+mike november oscar papa quebec romeo sierra tango uniform victor whiskey yankee zulu
+big buck bunny sintel tears steel elephants dream cosmos laundromat spring caminandes
+night day city river house ghost star king queen return last first lost dark'''.split()
+common_words = 'a an and the of in on at to for with from'.split()
+resolutions = '480p 576p 720p 1080p 2160p 4k UltraHD HD-TS'.split()
+tags = 'XViD x264 H264 HDTV WEBRip BluRay AAC DD5.1 rarbg YIFY'.split()
+rippers = 'AMIABLE CPG CTG DIAMOND DRONES EVO GECKOS KLEENEX KTR PLAYNOW RARBG ROVER SPARKS VBT XVID YIFY'.split()
+exts = '.mp4 .mkv .avi .wmv _mp4 _avi'.split()
+hosts = 'example.com files.example.org cdn.example.net mirror.example.info'.split()
+date_formats = '%d%m%y %Y.%m.%d %Y_%m_%d %d.%m.%Y %y.%m.%d %Y-%m-%d'.split()
+seps = '. _ -'.split()
+
+
+class Corpus:
+    """
+    Deterministic for a given seed. duplicates is the fraction of lines
+    repeating an earlier one.
+    """
+    def __init__(self, seed=0, ntitles=None, duplicates=0.05):
+        self.random = random.Random(seed)
+        self.ntitles = ntitles
+        self.duplicates = duplicates
+        self.titles = []
+        self.lines = []
+    def get_title(self, ntitles):
+        r = self.random
+        if self.titles and (ntitles <= len(self.titles) or r.random() < 0.5):
+            return r.choice(self.titles)
+        words = r.sample(title_words, r.randint(1, 4))
+        if r.random() < 0.3:
+            words.insert(r.randint(1, len(words)), r.choice(common_words))
+        title = [ w.capitalize() if r.random() < 0.7 else w for w in words ]
+        self.titles.append(title)
+        return title
+    def get_date(self):
+        r = self.random
+        year = r.randint(1995, 2020)
+        return '%04d-%02d-%02d' % (year, r.randint(1, 12), r.randint(1, 28))
+    def get_filename(self, ntitles):
+        r = self.random
+        parts = list(self.get_title(ntitles))
+        roll = r.random()
+        if roll < 0.35:
+            y, m, d = self.get_date().split('-')
+            f = r.choice(date_formats)
+            parts.append(f.replace('%Y', y).replace('%y', y[2:]).replace('%m', m).replace('%d', d))
+        elif roll < 0.6:
+            parts.append(str(r.randint(1950, 2020)))
+        if r.random() < 0.7:
+            parts.append(r.choice(resolutions))
+        parts.extend(r.sample(tags, r.randint(0, 3)))
+        if r.random() < 0.05:
+            parts.append('XXX')
+        if r.random() < 0.4:
+            parts.append(r.choice(rippers))
+        sep = r.choice(seps)
+        filename = sep.join(parts)
+        if r.random() < 0.2:
+            filename = '[%s] %s' % (r.choice(rippers), filename)
+        return filename+r.choice(exts)
+    def get_line(self, ntitles):
+        r = self.random
+        if self.lines and (r.random() < self.duplicates):
+            return r.choice(self.lines)
+        filename = urllib.parse.quote(self.get_filename(ntitles))
+        if r.random() < 0.15:
+            line = 'https://openload.co/f/%s/%s' % ('%011x' % r.getrandbits(44), filename)
+        else:
+            line = 'http://%s/%s/%s' % (r.choice(hosts), r.choice('files dl media/video pub'.split()), filename)
+        if len(self.lines) < (1<<16):
+            self.lines.append(line)
+        return line
+    def generate(self, size):
+        """
+        Yields size lines
+        """
+        ntitles = self.ntitles or max(size//20, min(size, 50))
+        for _ in range(size):
+            yield self.get_line(ntitles)
+
+
+def generate(size, **kwargs):
+    return Corpus(**kwargs).generate(size)
+
+
+def write_corpus(filename, size, **kwargs):
+    with open(filename, 'w') as fo:
+        for line in generate(size, **kwargs):
+            fo.write(line+'\n')
+    return filename
@@ -0,0 +1,61 @@
+#! /usr/bin/env python3
+"""
+Startup time of the urlsort command in fresh processes, and which slow
+modules it imports.
+"""
+import os, os.path
+import subprocess
+import sys
+import time
+
+
+CLI = "import sys; sys.argv[0] = 'urlsort'; from url_sort.cli import main; sys.exit(main())"
+slow_modules = 'url_sort.loader url_sort.parser dateutil numpy requests tqdm'.split()
+
+
+def get_env():
+    """
+    Returns the environment for child processes, importing url_sort from
+    the same place as this process
+    """
+    env = dict(os.environ)
+    top = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (top, env.get('PYTHONPATH')) if p)
+    return env
+def run(args, input=None, importtime=False):
+    """
+    Returns (seconds, stderr) of one urlsort process
+    """
+    command = [ sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', CLI, *args ]
+    start = time.perf_counter()
+    p = subprocess.run(command, input=input, env=get_env(), \
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    elapsed = time.perf_counter()-start
+    if p.returncode:
+        raise RuntimeError("%s exited %d: %s" % (' '.join(args), p.returncode, p.stderr.decode()[-1000:]))
+    return elapsed, p.stderr.decode()
+def imported(stderr):
+    """
+    Returns the module names in -X importtime output
+    """
+    names = set()
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and ('|' in line):
+            names.add(line.rsplit('|', 1)[-1].strip())
+    return names
+def measure(args, input=None, repeat=5):
+    """
+    Returns the best of repeat runs, and the slow modules imported
+    """
+    run(args, input=input) # warm up caches
+    seconds = min(run(args, input=input)[0] for _ in range(repeat))
+    _, stderr = run(args, input=input, importtime=True)
+    names = imported(stderr)
+    return { 'seconds': seconds, 'slow_modules': [ m for m in slow_modules if m in names ] }
+def get_commands(lines):
+    """
+    Returns { name: (args, input) }, sorting the first 10 of lines
+    """
+    sample = '\n'.join(lines[:10]).encode()
+    return { 'urlsort --help': (['--help'], None),
+             'urlsort < 10 lines': ([], sample) }
@@ -5,12 +5,32 @@ Q: Got a list of unsorted URLs?
 A: We are DEVO!
 
 Usage:
+  urlsort [ -v | -vv ] serve [--socket=PATH]
+  urlsort [ -v | -vv ] client [options] [--json] [--socket=PATH] [--] [FILE ...]
   urlsort [ -v | -vv ] [options] [--] [FILE ...]
 
 Options:
   -h --help     This help
   -b --by=key   Set the sort key
+  -n --limit=N  Only output the first N urls
+  --format=FORMAT  Output as m3u, or one url per line as jsonl, tsv or
+                plain [default: m3u]
+  -j --jobs=N   Parse and tokenize in N processes
+  --stats=FILE  Write stage timings and cache statistics as JSON
+  --incremental  Only tokenize lines unseen by earlier incremental runs,
+                reusing the tokens saved for the others
+  --dedup=MODE  Drop repeated urls (same host and path) as they are read,
+                remembering each exactly or in a fixed-size bloom filter:
+                exact or bloom
+  --memory=SIZE  Sort out of core, in sorted runs of about SIZE (like 512M)
+                written to temporary files, then merged
   -v --verbose  More output
+
+Resident mode:
+  serve            Keep the config and caches loaded, sorting for clients
+  client           Sort by sending FILEs to a running 'urlsort serve'
+  --json           Same as --format=jsonl
+  --socket=PATH    [default: ~/.cache/urlsort.sock]
 """
 import logging
 logger = logging.getLogger(__name__)
@@ -23,7 +43,8 @@ import sys
 
 from docopt import docopt
 
-from .parser import *
+from .output import formats, write_urls
+from .stats import Stats
 
 
 def main():
@@ -32,10 +53,53 @@ def main():
     verbose = options.pop('--verbose')
     if verbose:
         logging.basicConfig(level=logging.DEBUG if (1 < verbose) else logging.INFO )
-    urls = sort_urls(*filenames, order=options.pop('--by'))
+    socket_path = options.pop('--socket')
+    if options.pop('serve'):
+        from .server import serve
+        try:
+            return serve(socket_path)
+        except OSError as e:
+            print("urlsort serve:", e, file=sys.stderr)
+            return 1
+    if options.pop('client'):
+        if options.pop('--stats'):
+            print("--stats is not available with client, the server does the sorting", file=sys.stderr)
+            return 2
+        # avoids loading the search config
+        from .server import request
+        args = [ sys.stdin.buffer if f is sys.stdin else f for f in filenames ]
+        try:
+            status = request(*args, socket_path=socket_path, output=sys.stdout.buffer, \
+                    order=options.pop('--by'), limit=options.pop('--limit'), \
+                    dedup=options.pop('--dedup'), jobs=options.pop('--jobs'), \
+                    incremental=options.pop('--incremental'), memory=options.pop('--memory'), \
+                    format='jsonl' if options.pop('--json') else options.pop('--format'))
+        except BrokenPipeError:
+            sys.exit(0)
+        except OSError as e: # like no server listening
+            print("urlsort client: %s: %s" % (socket_path, e.strerror or e), file=sys.stderr)
+            return 1
+        if not status.get('ok'):
+            print("urlsort serve:", status.get('error'), file=sys.stderr)
+            return 1
+        return 0
+    format = options.pop('--format')
+    if format not in formats:
+        print("--format must be one of:", ' '.join(sorted(formats)), file=sys.stderr)
+        return 2
+    from .parser import sort_urls
+    stats_filename = options.pop('--stats')
+    stats = Stats()
+    urls = sort_urls(*filenames, order=options.pop('--by'), limit=options.pop('--limit'), \
+            jobs=options.pop('--jobs'), stats=stats, incremental=options.pop('--incremental'), \
+            dedup=options.pop('--dedup'), memory=options.pop('--memory'))
     try:
-        print('\n\n'.join(u.to_m3u() for u in urls))
+        write_urls(urls, sys.stdout, format=format)
     except BrokenPipeError:
         sys.exit(0)
     except:
         raise
+    finally:
+        if stats_filename:
+            with open(stats_filename, 'w') as fo:
+                stats.dump(fo, indent=2)
@@ -0,0 +1,66 @@
+#! /usr/bin/env python3
+"""
+Filters that drop repeated urls, keyed like URLBase.__hash__ on host and
+path.
+
+ExactFilter remembers every key. BloomFilter uses a fixed number of bits,
+sized for an expected number of distinct urls and a false positive rate;
+past that capacity more distinct urls are wrongly dropped, but memory does
+not grow.
+"""
+import logging
+logger = logging.getLogger(__name__)
+debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger.error, logger.critical
+
+import collections
+import math
+
+
+class ExactFilter:
+    def __init__(self):
+        self.seen = set()
+        self.stats = collections.Counter(kept=0, dropped=0)
+    def add(self, key):
+        """
+        Returns True if key is new
+        """
+        if key in self.seen:
+            self.stats['dropped'] += 1
+            return False
+        self.seen.add(key)
+        self.stats['kept'] += 1
+        return True
+class BloomFilter(ExactFilter):
+    def __init__(self, capacity=1<<20, error_rate=1e-3):
+        self.nbits = max(8, int(-capacity*math.log(error_rate)/math.log(2)**2))
+        self.nhashes = max(1, round(self.nbits/capacity*math.log(2)))
+        self.bits = bytearray((self.nbits+7)//8)
+        self.stats = collections.Counter(kept=0, dropped=0)
+        debug("%d-bit bloom filter with %d hashes", self.nbits, self.nhashes)
+    def _positions(self, key):
+        # double hashing
+        h1 = hash(key)
+        h2 = hash((key, self.nbits)) | 1
+        return [ (h1+i*h2) % self.nbits for i in range(self.nhashes) ]
+    def add(self, key):
+        bits = self.bits
+        new = False
+        for p in self._positions(key):
+            i, mask = p >> 3, 1 << (p & 7)
+            if not (bits[i] & mask):
+                bits[i] |= mask
+                new = True
+        self.stats['kept' if new else 'dropped'] += 1
+        return new
+filters = { 'exact': ExactFilter, 'bloom': BloomFilter }
+
+
+def get_filter(mode):
+    """
+    Returns a filter given its mode name, or an existing filter
+    """
+    if hasattr(mode, 'add'):
+        return mode
+    if mode in filters:
+        return filters[mode]()
+    raise ValueError("dedup=%s not recognized" % mode)
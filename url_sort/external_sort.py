@@ -0,0 +1,113 @@
+#! /usr/bin/env python3
+"""
+Sorting more records than fit in memory: records are pickled one after
+another into temporary files, sorted in runs that fit a memory budget, and
+the runs merged.
+
+Memory is estimated from the pickled size of each record, times
+expansion, since unpickled objects are several times larger.
+"""
+import logging
+logger = logging.getLogger(__name__)
+debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger.error, logger.critical
+
+import heapq
+import operator
+import os, os.path
+import pickle
+import re
+import tempfile
+
+
+size_pattern = re.compile('([0-9.]+)\\s*([kmgt]?)i?b?$', re.IGNORECASE)
+size_units = { '': 1, 'k': 1<<10, 'm': 1<<20, 'g': 1<<30, 't': 1<<40 }
+def parse_size(text):
+    """
+    Returns bytes for sizes like 1048576, 512M or 2GiB
+    """
+    if isinstance(text, (int, float)):
+        return int(text)
+    m = size_pattern.match(text.strip())
+    if not m:
+        raise ValueError("size '%s' not recognized" % text)
+    n, unit = m.groups()
+    return int(float(n)*size_units[unit.lower()])
+
+
+def write_pickles(iterable, fo):
+    """
+    Returns the number of items written
+    """
+    n = 0
+    dump = pickle.Pickler(fo, protocol=pickle.HIGHEST_PROTOCOL).dump
+    for n, item in enumerate(iterable, start=1):
+        dump(item)
+    return n
+def read_pickles(filename, sizes=False, buffering=1<<16):
+    """
+    Yields the items pickled into filename, or (item, nbytes) if sizes
+    """
+    with open(filename, 'rb', buffering=buffering) as fi:
+        load, tell = pickle.Unpickler(fi).load, fi.tell
+        start = 0
+        while True:
+            try:
+                item = load()
+            except EOFError:
+                return
+            if sizes:
+                end = tell()
+                yield item, end-start
+                start = end
+            else:
+                yield item
+
+
+class Spool:
+    """
+    A temporary directory of pickle files. Use as a context manager; the
+    files are removed on exit.
+    """
+    def __init__(self, dir=None, prefix='urlsort-'):
+        self.tempdir = tempfile.TemporaryDirectory(dir=dir, prefix=prefix)
+        self.nfiles = 0
+    def write(self, iterable):
+        """
+        Returns the filename written, and the number of items
+        """
+        self.nfiles += 1
+        filename = os.path.join(self.tempdir.name, '%06d.pickle' % self.nfiles)
+        with open(filename, 'wb', buffering=1<<16) as fo:
+            n = write_pickles(iterable, fo)
+        return filename, n
+    def sorted(self, rows, memory, expansion=4):
+        """
+        Yields item in order of key, for (key, item, nbytes) rows, keeping
+        about memory bytes of rows at a time. Equal keys keep input order.
+        """
+        key = operator.itemgetter(0)
+        runs, run, size = [], [], 0
+        for k, item, nbytes in rows:
+            run.append((k, item))
+            size += nbytes*expansion
+            if memory <= size:
+                run.sort(key=key)
+                filename, n = self.write(run)
+                debug("Sorted run of %d records into '%s'", n, filename)
+                runs.append(filename)
+                run, size = [], 0
+        run.sort(key=key)
+        if not runs:
+            for _, item in run:
+                yield item
+            return
+        info("Merging %d sorted runs", len(runs)+bool(run))
+        # heapq.merge takes equal keys from earlier runs first
+        for _, item in heapq.merge(*map(read_pickles, runs), run, key=key):
+            yield item
+    def close(self):
+        self.tempdir.cleanup()
+    def __enter__(self):
+        return self
+    def __exit__(self, e_type, e, traceback):
+        self.close()
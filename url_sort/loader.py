@@ -2,26 +2,123 @@
 """
 Example of loading python modules from the current directory.
 WARNING: not necessarily a _good_ example.
+
+The loaded configuration is pickled into CONFIG_CACHE, together with the
+mtime and size of every file it was built from. Later runs load that with a
+single read, and only import the config module again when a source changes.
 """
 
 import logging
 logger = logging.getLogger()
 debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger.error, logger.critical
 
+import glob
+import hashlib
 import importlib
 import os, os.path
+import pickle
 import sys
 
 
-sys.path.insert(0, os.path.abspath('.'))
+CONFIG_CACHE = '~/.cache/urlsort-config-%s.pickle'
+
+config_dir = os.path.abspath('.')
+sys.path.insert(0, config_dir)
 config_mod_name = 'load'
-search_config	= importlib.import_module(config_mod_name, '.')
-debug(          "Loaded search config from '%s'", str(search_config))
-common_words	= search_config.common_words
-info(           "{} common words".format(len(common_words)) )
-resolutions	= search_config.resolutions
-info(           "resolutions: {}".format(resolutions) )
-search_terms	= search_config.search_terms
-info(           "search_terms: {}".format(search_terms) )
-tag_terms	= search_config.tag_terms
-info(           "tag_terms: {}".format(tag_terms) )
+config_fields = 'common_words resolutions search_terms tag_terms'.split()
+
+
+class SearchConfig:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+    def __repr__(self):
+        return "<search config from '%s'>" % self.source
+
+
+def get_stamps(paths):
+    """
+    Returns [ (path, mtime, size) ], with None for missing files
+    """
+    stamps = []
+    for p in sorted(set(paths)):
+        try:
+            st = os.stat(p)
+        except OSError:
+            stamps.append((p, None, None))
+        else:
+            stamps.append((p, st.st_mtime_ns, st.st_size))
+    return stamps
+
+
+def get_sources(mod, config):
+    paths = [ mod.__file__ ]
+    paths.extend(glob.glob(os.path.join(config_dir, '*.list')))
+    for name in config_fields:
+        paths.extend(getattr(getattr(config, name), 'sources', []))
+    return paths
+
+
+def import_config():
+    mod = importlib.import_module(config_mod_name, '.')
+    debug(      "Loaded search config from '%s'", str(mod))
+    config = SearchConfig(source=mod.__file__, \
+            **{ name: getattr(mod, name) for name in config_fields })
+    config.stamps = get_stamps(get_sources(mod, config))
+    return config
+
+
+def load_config(cache_filename=None):
+    if cache_filename is None:
+        cache_filename = CONFIG_CACHE % hashlib.md5(config_dir.encode()).hexdigest()[:12]
+    cache_filename = os.path.expanduser(cache_filename)
+    try:
+        with open(cache_filename, 'rb') as fi:
+            config = pickle.load(fi)
+    except FileNotFoundError:
+        debug("No compiled config at '%s'", cache_filename)
+    except Exception as e:
+        warn("Ignoring unreadable compiled config '%s': %s", cache_filename, e)
+    else:
+        if config.stamps == get_stamps(p for p, *_ in config.stamps):
+            debug("Loaded compiled config from '%s'", cache_filename)
+            return config
+        info("Search config changed, rebuilding '%s'", cache_filename)
+    config = import_config()
+    temp_filename = '%s.%d' % (cache_filename, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+        with open(temp_filename, 'wb') as fo:
+            pickle.dump(config, fo, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filename, cache_filename)
+    except Exception as e: # like unpicklable objects in a user config
+        warn("Could not save compiled config '%s': %s", cache_filename, e)
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+    return config
+
+
+_search_config = None
+def get_search_config():
+    """
+    Loads the config on first use
+    """
+    global _search_config
+    if _search_config is None:
+        config = _search_config = load_config()
+        info(   "{} common words".format(len(config.common_words)) )
+        info(   "resolutions: {}".format(config.resolutions) )
+        info(   "search_terms: {}".format(config.search_terms) )
+        info(   "tag_terms: {}".format(config.tag_terms) )
+    return _search_config
+def __getattr__(name):
+    """
+    search_config and its fields, like loader.common_words, are loaded when
+    first accessed rather than on import
+    """
+    if name == 'search_config':
+        return get_search_config()
+    if name in config_fields:
+        return getattr(get_search_config(), name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,64 @@
+#! /usr/bin/env python3
+"""
+Writing sorted urls as they are produced.
+
+m3u is the playlist urlsort has always printed. The machine formats, jsonl,
+tsv and plain, skip its shell quoting:
+  jsonl: one url_sort.url.URL.to_dict() per line
+  tsv: the fields of tsv_fields, tab-separated, lists joined by '/'
+  plain: one url per line
+"""
+import json
+
+
+tsv_fields = 'url title date tags resolutions filename'.split()
+
+
+def format_m3u(urls):
+    for i, u in enumerate(urls):
+        yield ('\n\n' if i else '')+u.to_m3u()
+    yield '\n'
+def format_jsonl(urls, dumps=json.dumps):
+    for u in urls:
+        yield dumps(u.to_dict())+'\n'
+def _tsv_field(value, table=str.maketrans('\t\n\r', '   ')):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        value = '/'.join(value)
+    return str(value).translate(table)
+def format_tsv(urls, fields=tsv_fields):
+    for u in urls:
+        d = u.to_dict()
+        yield '\t'.join(_tsv_field(d[k]) for k in fields)+'\n'
+def format_plain(urls):
+    for u in urls:
+        yield str(u)+'\n'
+formats = { 'm3u': format_m3u,
+    'jsonl': format_jsonl,
+    'json': format_jsonl, # older name
+    'tsv': format_tsv,
+    'plain': format_plain }
+
+
+def format_urls(urls, format='m3u'):
+    """
+    Yields text for each url, in the given format
+    """
+    if format not in formats:
+        raise ValueError("format=%s not recognized" % format)
+    return formats[format](urls)
+def write_urls(urls, fo, format='m3u', buffer_size=1<<16):
+    """
+    Writes urls to fo as they are produced, in chunks of about buffer_size
+    characters
+    """
+    chunk, size = [], 0
+    for text in format_urls(urls, format=format):
+        chunk.append(text)
+        size += len(text)
+        if buffer_size <= size:
+            fo.write(''.join(chunk))
+            chunk, size = [], 0
+    fo.write(''.join(chunk))
+    fo.flush()
@@ -4,99 +4,414 @@ logger = logging.getLogger(__name__)
 debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger.error, logger.critical
 
 import collections
+import functools
+import heapq
 import itertools
 import math
+import mmap
+import multiprocessing
 import urllib.parse
 import sys
 
 if sys.stderr.isatty():
-    from tqdm import tqdm as progress
+    def progress(arg, **kwargs):
+        from tqdm import tqdm
+        return tqdm(arg, **kwargs)
 else:
     def progress(arg, **kwargs):
         return arg
 
 
 from . import loader
+from .dedup import get_filter
+from .external_sort import Spool, parse_size, read_pickles
 from .persistent_cache import TextArgMemo
+from .stats import Stats
 from .url import URL
+from .word_counts import IncrementalStore
 from .util import *
 
 config = loader.search_config
 
 
-CACHE_DB = '~/.cache/urlsort.db'
+CACHE_DB = '~/.cache/urlsort.sqlite'
 
 
 class OpenloadURL(URL):
-    def from_text(self, *args, **kwargs):
-        super().from_text(*args, **kwargs)
-        ppath, _ = pathsplit(self.urlparts.path)
-        self.urlparts = self.urlparts._replace(path=ppath)
+    __slots__ = ()
+    def split_url(self, *args, **kwargs):
+        parts = super().split_url(*args, **kwargs)
+        ppath, _ = pathsplit(parts.path)
+        return parts._replace(path=ppath)
+
+
+def parse_url(line):
+    if 'openload.co' in line.lower():
+        return OpenloadURL(line)
+    else:
+        return URL(line)
+
+
+def urlsort_url(line):
+    """
+    parse_url(), under the name memo caches know it by
+    """
+    return parse_url(line)
+
+
+def url_key(line, urlsplit=urllib.parse.urlsplit):
+    """
+    Returns the key of the url on line, as parse_url(line).key would, or the
+    line itself if it cannot be parsed. Cheaper than parsing, since the line
+    is parsed again later.
+    """
+    try:
+        parts = urlsplit(line)
+    except ValueError:
+        return line
+    path = parts.path
+    if 'openload.co' in line.lower(): # see OpenloadURL
+        path, _ = pathsplit(path)
+    return parts.netloc, path
+def _map_blocks(filename, blocksize=1<<16):
+    """
+    Yields blocks of whole lines of filename, as bytes, of about blocksize
+    bytes each.
+
+    The first next() raises OSError or ValueError for files that cannot be
+    memory-mapped, like empty files and pipes.
+    """
+    with open(filename, 'rb') as fi:
+        mm = mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+    with mm:
+        if hasattr(mm, 'madvise'):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        size, start = len(mm), 0
+        while start < size:
+            # blocks end after a newline, so never split a CRLF
+            end = mm.find(b'\n', start+blocksize)
+            end = size if (end < 0) else end+1
+            yield mm[start:end]
+            start = end
+def _text_blocks(f, blocksize=1<<16):
+    """
+    Yields lists of lines from an iterable of str, like an open text file
+    """
+    if hasattr(f, 'readlines'):
+        return iter(lambda: f.readlines(blocksize), [])
+    f = iter(f)
+    return iter(lambda: list(itertools.islice(f, blocksize>>6)), [])
+def _open_text_blocks(filename, encoding='utf-8', blocksize=1<<16):
+    """
+    _text_blocks() of filename, closing it once read
+    """
+    with open(filename, encoding=encoding) as f:
+        yield from _text_blocks(f, blocksize)
+def _read_batches(*args, dedup=None, stats=None, encoding='utf-8', blocksize=1<<16, \
+        controls=tuple(bytes([c]) for c in b'\x0b\x0c\x1c\x1d\x1e\x1f')):
+    """
+    Yields lists of (order, line) for non-blank lines, numbered across all
+    files, each batch from about blocksize bytes of input.
 
+    Files named by str are memory-mapped and split as bytes, ending lines like
+    universal newlines do. Blank lines are skipped before decoding. Other
+    arguments are iterables of str lines, like open text files.
 
-def _read_files(*args, mode='rU'):
+    dedup='exact' or 'bloom' (see url_sort.dedup) skips lines whose url_key
+    was already read. Order numbers are unchanged.
+    """
+    if dedup:
+        if stats is None:
+            stats = Stats()
+        f = get_filter(dedup)
+        key = stats.timed_call('dedup', url_key)
+        for batch in _read_batches(*args, encoding=encoding, blocksize=blocksize):
+            batch = [ row for row in batch if f.add(key(row[1])) ]
+            if batch:
+                yield batch
+        stats.add_cache('dedup', f.stats)
+        if f.stats['dropped']:
+            info("%d duplicate urls dropped", f.stats['dropped'])
+        return
     order=0
-    with TextArgMemo(CACHE_DB) as memo:
-        @memo.wrap
-        def urlsort_url(line):
-            if 'openload.co' in line.lower():
-                return OpenloadURL(line)
+    for arg in args:
+        blocks, decode = None, False
+        if isinstance(arg, str):
+            try:
+                blocks, decode = _map_blocks(arg, blocksize), True
+                block = next(blocks, b'')
+            except (OSError, ValueError) as e:
+                debug("Reading '%s' without mmap: %s", arg, e)
+                blocks, decode = None, False
+            else:
+                blocks = itertools.chain([block], blocks)
+            if blocks is None:
+                blocks = _open_text_blocks(arg, encoding, blocksize)
+        else: # assume iterable
+            blocks = _text_blocks(arg, blocksize)
+        for block in blocks:
+            if not decode:
+                lines = block
+            elif block.isascii() and not any(c in block for c in controls):
+                # str.splitlines() and str.strip() agree with bytes for these,
+                # and decoding the whole block at once is cheaper
+                lines = block.decode('ascii').splitlines()
             else:
-                return URL(line)
-        for arg in args:
-            if isinstance(arg, str):
-                f = open(arg, mode)
-            else: # assume iterable
-                f = arg
-            for order, line in enumerate(f, start=order+1):
-                line = line.strip()
-                if line:
-                    u = urlsort_url(line)
-                    ### memo-wrapped functions can return a stealthy zombie exception from previous runs.
-                    if isinstance(u, Exception):
-                        raise u
-                    ###
-                    u.order = order
-                    yield u
+                lines = [ line.decode(encoding) if line.strip() else '' for line in block.splitlines() ]
+            lines = list(map(str.strip, lines))
+            batch = list(zip(range(order+1, order+len(lines)+1), lines))
+            if '' in lines:
+                batch = [ row for row in batch if row[1] ]
+            order += len(lines)
+            if batch:
+                yield batch
+def _read_lines(*args, **kwargs):
+    """
+    Yields (order, line) for non-blank lines, numbered across all files.
+    Takes the arguments of _read_batches.
+    """
+    for batch in _read_batches(*args, **kwargs):
+        yield from batch
+def _read_files(*args, stats=None, memo=None, dedup=None, **kwargs):
+    """
+    memo is an open TextArgMemo to use instead of opening CACHE_DB
+    """
+    if memo is None:
+        with TextArgMemo(CACHE_DB) as memo:
+            yield from _read_files(*args, stats=stats, memo=memo, dedup=dedup, **kwargs)
+        return
+    if stats is None:
+        stats = Stats()
+    memo_stats = collections.Counter(memo.stats)
+    parse = memo.wrap(urlsort_url)
+    batches = _read_batches(*args, dedup=dedup, stats=stats, **kwargs)
+    for batch in stats.timed_iter('reading', batches, count=len):
+        with stats.timed('parsing', count=len(batch)):
+            urls = parse.many([ (line,) for _, line in batch ])
+        for (order, _), u in zip(batch, urls):
+            ### memo-wrapped functions can return a stealthy zombie exception from previous runs.
+            if isinstance(u, Exception):
+                raise u
+            ###
+            u.order = order
+            yield u
+    stats.add_cache('memo', { k: v-memo_stats[k] for k, v in memo.stats.items() })
 def read_files(*args, **kwargs):
     return list(_read_files(*args, **kwargs))
 
 
-def tokenize_urls(*args, counts=None, common_words=config.common_words):
+def token_key(url):
+    words = url.tokenize()
+    return [ t.lower() for t in words ]
+tokenized_fields = 'date res_score tag_score resolutions tags _title adult ripper'.split()
+def _tokenize_chunk(lines, fields=tokenized_fields):
+    """
+    Runs in a worker process. Returns [ (tokens, values) ] in input order,
+    values being those of fields after tokenizing, which is all that
+    _rebuild_url needs besides the line. Unset fields are None.
+    """
+    results = []
+    for line in lines:
+        u = parse_url(line)
+        tokens = token_key(u)
+        results.append((tokens, tuple(getattr(u, k, None) for k in fields)))
+    return results
+def _rebuild_url(order, line, values, fields=tokenized_fields):
+    """
+    Returns the url of line, as tokenized by _tokenize_chunk, without
+    parsing it again
+    """
+    cls = OpenloadURL if ('openload.co' in line.lower()) else URL # see parse_url
+    u = cls.__new__(cls)
+    u._text, u.order = line, order
+    for k, v in zip(fields, values):
+        if (v is not None) or (k not in ('adult', 'ripper')):
+            setattr(u, k, v)
+    return u
+def _tokenize_parallel(*args, jobs, stats=None, dedup=None, **kwargs):
+    """
+    Parses and tokenizes lines in a pool of jobs processes, yielding
+    (tokens, url) in the same order as the serial path. Each batch from
+    _read_batches is one chunk of work. Workers get only the lines, and
+    send back only tokens and the fields tokenizing sets, from which urls
+    are rebuilt here. The memo cache is not consulted: workers parse each
+    line themselves, as tokenizing it needs parsing anyway.
+    """
+    if stats is None:
+        stats = Stats()
+    chunks = stats.timed_iter('reading', _read_batches(*args, dedup=dedup, stats=stats, **kwargs), count=len)
+    sent = collections.deque() # batches, as the pool reads them in its own thread
+    def lines():
+        for batch in chunks:
+            sent.append(batch)
+            yield [ line for _, line in batch ]
+    with multiprocessing.Pool(jobs) as pool:
+        for results in stats.timed_iter('tokenizing', pool.imap(_tokenize_chunk, lines()), count=len):
+            for (order, line), (tokens, values) in zip(sent.popleft(), results):
+                yield tokens, _rebuild_url(order, line, values)
+
+
+def _tokenize_incremental(*args, store, jobs=None, stats=None, memo=None, dedup=None):
+    """
+    Yields (tokens, url), only parsing and tokenizing lines not already in
+    store, and adding those. They are tokenized in a pool of jobs processes
+    if jobs is more than 1, otherwise parsed with memo, an open TextArgMemo,
+    if given.
+    """
+    if stats is None:
+        stats = Stats()
+    jobs = int(jobs or 1)
+    if memo is None:
+        parse = lambda lines: list(map(parse_url, lines))
+    else:
+        memo_stats = collections.Counter(memo.stats)
+        parse_many = memo.wrap(urlsort_url).many
+        parse = lambda lines: parse_many([ (line,) for line in lines ])
+    tokenize = stats.timed_call('tokenizing', token_key)
+    def tokenize_lines(lines):
+        with stats.timed('parsing', count=len(lines)):
+            urls = parse(lines)
+        results = []
+        for u in urls:
+            if isinstance(u, Exception): # from the memo, see _read_files
+                raise u
+            results.append((tokenize(u), u))
+        return results
+    def rebuild_lines(lines, result):
+        with stats.timed('tokenizing', count=len(lines)):
+            values = result.get()
+        return [ (tokens, _rebuild_url(None, line, v)) for line, (tokens, v) in zip(lines, values) ]
+    def finish(batch, rows, get_new):
+        new = iter(get_new())
+        for (order, line), row in zip(batch, rows):
+            if row is None:
+                tokens, u = next(new)
+                store.add(line, tokens, u)
+            else:
+                tokens, u = row
+            u.order = order
+            yield tokens, u
+    batches = stats.timed_iter('reading', _read_batches(*args, dedup=dedup, stats=stats), count=len)
+    pool = multiprocessing.Pool(jobs) if (1 < jobs) else None
+    try:
+        window = collections.deque() # batches whose new lines are being tokenized
+        for batch in batches:
+            rows = store.get_many([ line for _, line in batch ])
+            missing = [ line for (_, line), row in zip(batch, rows) if row is None ]
+            if pool is None:
+                yield from finish(batch, rows, functools.partial(tokenize_lines, missing))
+                continue
+            result = pool.apply_async(_tokenize_chunk, (missing,))
+            window.append((batch, rows, functools.partial(rebuild_lines, missing, result)))
+            if 2*jobs < len(window):
+                yield from finish(*window.popleft())
+        while window:
+            yield from finish(*window.popleft())
+    finally:
+        if pool is not None:
+            pool.terminate()
+    stats.add_cache('incremental', store.stats)
+    if memo is not None:
+        stats.add_cache('memo', { k: v-memo_stats[k] for k, v in memo.stats.items() })
+
+
+def _keyed_urls(*args, common_words=config.common_words, jobs=None, stats=None, memo=None, incremental=None, dedup=None):
+    """
+    Yields (tokens, url) in input order, from whichever of the serial,
+    parallel or incremental paths the arguments select
+    """
+    if stats is None:
+        stats = Stats()
+    if incremental:
+        yield from _tokenize_incremental(*args, store=incremental, jobs=jobs, stats=stats, memo=memo, dedup=dedup)
+    elif jobs and (1 < int(jobs)):
+        yield from _tokenize_parallel(*args, jobs=int(jobs), stats=stats, dedup=dedup)
+    else:
+        tokenize = stats.timed_call('tokenizing', token_key)
+        for u in _read_files(*args, stats=stats, memo=memo, dedup=dedup):
+            yield tokenize(u), u
+
+
+def tokenize_urls(*args, counts=None, common_words=config.common_words, jobs=None, stats=None, memo=None, incremental=None, dedup=None):
     """
     Returns urls ordered into possible groups, based on common words,
-    sorted by frequency of those words.
+    sorted by frequency of those words. Groups of equal frequency keep the
+    order their first url was read in, and urls within a group keep input
+    order.
+
+    jobs=N parses and tokenizes in N worker processes. Stage timings are
+    recorded into stats, if given. memo is an open TextArgMemo to reuse.
+
+    counts, a Counter, is updated with the tokens of every url.
+    incremental=True, or an open word_counts.IncrementalStore,
+    only tokenizes lines not seen in earlier runs, reusing the stored tokens
+    of the others. Words are still counted over every url read, so the
+    order is the same.
+
+    dedup='exact' or 'bloom' drops repeated urls as they are read, before
+    parsing and tokenizing.
     """
-    def key(url):
-        words = url.tokenize()
-        return [ t.lower() for t in words ]
-    groupings = groupby(progress(read_files(*args), unit='lines', desc="Reading %d files" % len(args)), key=key)
-    c = counts or collections.Counter()
+    if incremental is True:
+        with IncrementalStore() as store:
+            return tokenize_urls(*args, counts=counts, common_words=common_words, jobs=jobs, \
+                    stats=stats, memo=memo, incremental=store, dedup=dedup)
+    if stats is None:
+        stats = Stats()
+    desc = "Reading %d files" % len(args)
+    keyed = _keyed_urls(*args, common_words=common_words, jobs=jobs, stats=stats, memo=memo, \
+            incremental=incremental, dedup=dedup)
+    with stats.timed('grouping'):
+        groupings = groupby(progress(keyed, unit='lines', desc=desc), key=lambda row: row[0], sort=False)
+        for tokens, rows in groupings.items():
+            groupings[tokens] = [ u for _, u in rows ]
+    stats.add('grouping', count=len(groupings))
+    with stats.timed('scoring', count=len(groupings)):
+        return _score_groups(groupings, counts=counts, common_words=common_words)
+def _score_groups(groupings, counts=None, common_words=config.common_words):
+    c = collections.Counter() if (counts is None) else counts
     for tokens, urls in groupings.items():
         f = len(urls)
         for t in tokens:
             if not t.isdigit() and not (t.lower() in common_words):
                 c[t] += f
-    scores = { k: math.log2(v) for k, v in c.items() }
+    group_key = get_group_key(c)
     def score_sort(row):
         tokens, urls = row
-        return -sum(scores.get(t, 0) for t in tokens)
+        return group_key(tokens)
     return sorted(groupings.items(), key=score_sort)
-def score_urls(*args, \
-        search_terms=config.search_terms, **kwargs):
+def get_group_key(counts):
     """
-    Returns urls ordered by search relevance
+    Returns a function of tokens that sorts more frequent words first
+    """
+    scores = { k: math.log2(v) for k, v in counts.items() }
+    def group_key(tokens):
+        return -sum(scores.get(t, 0) for t in tokens)
+    return group_key
+def get_search_key(search_terms=config.search_terms):
+    """
+    Returns a function of tokens that sorts better search matches first
     """
     def search_key(tokens, default=0):
         score, _, _ = search_terms.replace_terms(tokens)
         return -(score or default)
+    return search_key
+def score_urls(*args, \
+        search_terms=config.search_terms, **kwargs):
+    """
+    Returns urls ordered by search relevance
+    """
+    search_key = get_search_key(search_terms)
+    stats = kwargs.setdefault('stats', Stats())
     tags = collections.Counter()
     score_by_tags = collections.Counter()
     ntitles = nadult = 0
     # score is negative
     i = progress(tokenize_urls(*args, **kwargs), unit='lines', desc='parsing') 
-    for score, urls in sorted( (search_key(tokens), urls) \
-            for tokens, urls in i ):
+    with stats.timed('scoring'):
+        # stable, so urls are never compared
+        scored = sorted( ((search_key(tokens), urls) \
+            for tokens, urls in i), key=lambda row: row[0] )
+    for score, urls in scored:
         ntitles += 1
         nadult += int(any(hasattr(u, 'adult') and u.adult for u in urls))
         for u in urls:
@@ -147,25 +462,165 @@ def combo(row):
     overall_score = (url.tag_score or 0) + 4*(url.res_score or 0) - search_score/3.14
     # NOTE: overall_score is opposite-signed for sorting reasons
     return (-overall_score, age_metric, order)
+
+
+# Vectorized sort keys, given the columns of _score_columns(). Each returns
+# keys for np.lexsort, which sorts by the last key first and is stable.
+@functools.lru_cache()
+def get_numpy():
+    """
+    Returns numpy, imported on first use, or None if not installed
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+def _score_columns(rows, now=now, default_age=timedelta(days=2*365.25)):
+    """
+    Returns arrays of the fields the sort keys use. The age metric of latest()
+    is monotonic in days, so days stands in for it: -1 where latest() gives
+    -1, otherwise days, which is 5 or more.
+    """
+    np = get_numpy()
+    search_score, tag_score, res_score, days, order = zip(*( (s, u.tag_score or 0, u.res_score or 0, \
+            (now-u.date).days if u.date else default_age.days, u.order) for s, u in rows ))
+    days = np.array(days, np.int64)
+    return { 'search_score': np.array(search_score, float), \
+             'tag_score': np.array(tag_score, float), \
+             'res_score': np.array(res_score, float), \
+             'age': np.where(days < 5, -1, days), \
+             'order': np.array(order, np.int64) }
+def _latest_columns(c):
+    return (c['order'], c['age'])
+def _highest_rank_columns(c):
+    return (c['order'], c['age'], c['search_score'])
+def _combo_columns(c):
+    # same operations in the same order as combo(), so ties are the same
+    overall_score = c['tag_score'] + 4*c['res_score'] - c['search_score']/3.14
+    return (c['order'], c['age'], -overall_score)
+LEXSORT_MIN = 1<<12 # fewer rows are not worth importing numpy
+column_keys = { combo: _combo_columns,
+    highest_rank: _highest_rank_columns,
+    latest: _latest_columns } # highest_resolution() is already cheaper per row
+def lexsort_rows(rows, key):
+    """
+    Returns rows sorted as sorted(rows, key=key) would, for the keys in
+    column_keys, computing the keys over whole columns with NumPy
+    """
+    np = get_numpy()
+    rows = list(rows)
+    if not rows:
+        return rows
+    return [ rows[i] for i in np.lexsort(column_keys[key](_score_columns(rows))) ]
+
+
 sort_keys = { 'default': combo,
     None: combo,
     'highest_rank': highest_rank,
     'highest_resolution': highest_resolution,
     'latest': latest,
     'word_popularity': None }
-def sort_urls(*args, order='default', **kwargs):
+def _sort_external(*args, key, memory, counts=None, common_words=config.common_words, \
+        search_terms=config.search_terms, incremental=None, stats=None, **kwargs):
+    """
+    Yields urls in the same order as sort_urls, holding only one record per
+    group in memory, plus sorted runs of about memory bytes.
+
+    A first pass tokenizes every url into a spool file, counting words and
+    noting where each group first appears. A second pass reads the spool
+    back, computing each url's full sort key, and sorts it out of core.
+    """
+    if incremental is True:
+        with IncrementalStore() as store:
+            yield from _sort_external(*args, key=key, memory=memory, counts=counts, common_words=common_words, \
+                    search_terms=search_terms, incremental=store, stats=stats, **kwargs)
+        return
+    if stats is None:
+        stats = Stats()
+    c = collections.Counter() if (counts is None) else counts
+    firsts = {} # tokens: order of first url
+    def first_pass(keyed):
+        for tokens, u in keyed:
+            tokens = tuple(tokens)
+            if tokens not in firsts:
+                firsts[tokens] = u.order
+            for t in tokens:
+                if not t.isdigit() and not (t.lower() in common_words):
+                    c[t] += 1
+            yield tokens, u
+    keyed = _keyed_urls(*args, common_words=common_words, stats=stats, incremental=incremental, **kwargs)
+    with Spool() as spool:
+        with stats.timed('spooling'):
+            filename, n = spool.write(first_pass(keyed))
+        stats.add('spooling', count=n)
+        stats.add('grouping', count=len(firsts))
+        with stats.timed('scoring', count=len(firsts)):
+            group_key, search_key = get_group_key(c), get_search_key(search_terms)
+            # the position of each group after tokenize_urls and score_urls
+            groups = { tokens: (group_key(tokens), order) for tokens, order in firsts.items() }
+            if key:
+                groups = { tokens: (search_key(tokens), *g) for tokens, g in groups.items() }
+        del firsts
+        def rows():
+            for (tokens, u), nbytes in read_pickles(filename, sizes=True):
+                g = groups[tokens]
+                if key:
+                    # g[0] is the search score
+                    yield (key((g[0], u)), *g, u.order), u, nbytes
+                else:
+                    yield (*g, u.order), u, nbytes
+        yield from stats.timed_iter('sorting', spool.sorted(rows(), memory=parse_size(memory)))
+def sort_urls(*args, order='default', limit=None, stats=None, memory=None, **kwargs):
+    """
+    limit=N keeps only the first N urls, using a bounded heap instead of
+    sorting everything. Other keyword arguments, like jobs=N, are passed to
+    tokenize_urls.
+
+    memory=SIZE, like 512M, sorts out of core in runs of about SIZE, for
+    inputs too large to sort in memory. The order is the same.
+
+    Pass a url_sort.stats.Stats as stats to collect timings and cache
+    statistics, which are complete once this generator is exhausted.
+    """
+    if stats is None:
+        stats = Stats()
+    if limit is not None:
+        limit = int(limit)
+        assert 0 <= limit
     if callable(order):
         key = order
     elif order in sort_keys:
         key = sort_keys[order]
     else:
         raise ValueError("order=%s not recognized" %(order))
-    if key:
-        for _, url in sorted(score_urls(*args, **kwargs), key=key):
+    if memory:
+        urls = _sort_external(*args, key=key, memory=memory, stats=stats, **kwargs)
+        if limit is not None:
+            urls = itertools.islice(urls, limit)
+        yield from urls
+    elif key:
+        rows = score_urls(*args, stats=stats, **kwargs)
+        with stats.timed('sorting'):
+            if (limit is None) and (key in column_keys):
+                rows = list(rows)
+            if (limit is None) and (key in column_keys) and (LEXSORT_MIN <= len(rows)) and get_numpy():
+                rows = lexsort_rows(rows, key)
+            elif limit is None:
+                rows = sorted(rows, key=key)
+            else:
+                # equivalent to sorted(rows, key=key)[:limit], ties included
+                rows = heapq.nsmallest(limit, rows, key=key)
+        stats.add('sorting', count=len(rows))
+        for _, url in rows:
             yield url
     else:
-        for _, urls in tokenize_urls(*args, **kwargs):
-            yield from urls
+        urls = itertools.chain.from_iterable(urls for _, urls in tokenize_urls(*args, stats=stats, **kwargs))
+        if limit is not None:
+            urls = itertools.islice(urls, limit)
+        yield from urls
+    stats.add_cache('parse_date', parse_date.cache_info())
+    stats.add_cache('regex', regex.cache_info())
     if __debug__:
         debug("parse_date() cache_info: %s", parse_date.cache_info())
         debug("regex() cache_info: %s", regex.cache_info())
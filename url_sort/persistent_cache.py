@@ -8,15 +8,24 @@ processing functions.
 By default, cache databases are uniquely named based on hostname. For extra credit, implement a different key-value store if you're 
 clustering your batch processing.
 
+Filenames ending in .sqlite (or .sqlite3, .db3) use SqliteStore, which batches writes into few transactions and tolerates concurrent
+readers. It keeps recently used entries in memory, still pickled, so repeated lookups skip the database. Anything else is opened
+with shelve.
+
+get_many() and set_many() look up and store many arguments at once, in one query where the store allows.
+
 See the included _test() function for an example application.
 """
 import logging
 logger=logging.getLogger(__name__)
 debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger.error, logger.critical
 
+import collections
 from datetime import datetime, timedelta
 import os, os.path
+import pickle
 import shelve as kvs # key-value store, keys must be strings
+import sqlite3
 import uuid
 
 now = datetime.now
@@ -90,6 +99,34 @@ class SquashBase:
     def __delitem__(self, arg):
         k = self._to_key(arg)
         del self.entries[k]
+    def get(self, arg, default=None):
+        """
+        Returns non-deleted contents, expired or not, with one lookup.
+        """
+        try:
+            return self[arg]
+        except KeyError:
+            return default
+    def get_many(self, args):
+        """
+        Returns [ contents or None ] in the order of args, like get().
+        """
+        keys = [ self._to_key(arg) for arg in args ]
+        if hasattr(self.entries, 'get_many'):
+            values = self.entries.get_many(keys)
+        else:
+            values = [ self.entries.get(k) for k in keys ]
+        return [ v or None for v in values ]
+    def set_many(self, items):
+        """
+        Stores (arg, value) pairs
+        """
+        pairs = [ (self._to_key(arg), value) for arg, value in items ]
+        if hasattr(self.entries, 'set_many'):
+            self.entries.set_many(pairs)
+        else:
+            for k, v in pairs:
+                self.entries[k] = v
     def __iter__(self):
         """
         Returns non-deleted arguments, expired or not.
@@ -98,13 +135,152 @@ class SquashBase:
             if isinstance(v, MemoDeleted):
                 continue
             yield self._from_key(k)
+class SqliteStore:
+    """
+    Dict-like store of pickled values in a SQLite table, in WAL mode.
+
+    Writes are buffered and committed every batch_size updates, and on
+    close(). The statements are constant strings, so sqlite3 prepares each
+    once and reuses it from its statement cache.
+
+    Up to cache_size recently read or written values are kept, pickled, in
+    an LRU, so a repeated lookup costs one unpickling and no query.
+    """
+    max_variables = 999 # the lowest SQLITE_MAX_VARIABLE_NUMBER
+    def __init__(self, filename, batch_size=1<<12, timeout=60, cache_size=1<<16):
+        self.batch_size = batch_size
+        self.pending = {}
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.stats = collections.Counter(hits=0, misses=0)
+        self.db = sqlite3.connect(filename, timeout=timeout)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL) WITHOUT ROWID')
+    def _remember(self, key, data):
+        cache = self.cache
+        cache[key] = data
+        cache.move_to_end(key)
+        if self.cache_size < len(cache):
+            cache.popitem(last=False)
+    def _lookup(self, key):
+        """
+        Returns pickled data from memory, or None
+        """
+        data = self.pending.get(key)
+        if data is None:
+            data = self.cache.get(key)
+            if data is not None:
+                self.cache.move_to_end(key)
+        self.stats['misses' if (data is None) else 'hits'] += 1
+        return data
+    def flush(self):
+        if self.pending:
+            debug("Committing %d entries", len(self.pending))
+            with self.db:
+                self.db.executemany('INSERT OR REPLACE INTO entries (key, value) VALUES (?, ?)', self.pending.items())
+            if self.cache_size:
+                for k, data in self.pending.items():
+                    self._remember(k, data)
+            self.pending.clear()
+    sync = flush
+    def close(self):
+        self.flush()
+        self.db.close()
+    def __len__(self):
+        self.flush()
+        (n,), = self.db.execute('SELECT COUNT(*) FROM entries')
+        return n
+    def __contains__(self, key):
+        if key in self.pending:
+            return True
+        return self.db.execute('SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone() is not None
+    def __getitem__(self, key):
+        data = self._lookup(key)
+        if data is None:
+            row = self.db.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            data = row[0]
+            if self.cache_size:
+                self._remember(key, data)
+        return pickle.loads(data)
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    def get_many(self, keys, default=None):
+        """
+        Returns [ value or default ] in the order of keys, querying for all
+        keys not in memory at once. Repeated keys get separate copies.
+        """
+        found = {}
+        missing = []
+        for k in keys:
+            if k not in found:
+                data = self._lookup(k)
+                if data is None:
+                    missing.append(k)
+                else:
+                    found[k] = data
+        for i in range(0, len(missing), self.max_variables):
+            chunk = missing[i:i+self.max_variables]
+            query = 'SELECT key, value FROM entries WHERE key IN (%s)' % ','.join('?'*len(chunk))
+            for k, data in self.db.execute(query, chunk):
+                found[k] = data
+                if self.cache_size:
+                    self._remember(k, data)
+        return [ pickle.loads(found[k]) if (k in found) else default for k in keys ]
+    def __setitem__(self, key, value):
+        self.pending[key] = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.batch_size <= len(self.pending):
+            self.flush()
+    def set_many(self, items):
+        """
+        Stores (key, value) pairs
+        """
+        for k, v in items:
+            self.pending[k] = pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.batch_size <= len(self.pending):
+            self.flush()
+    def __delitem__(self, key):
+        self.flush()
+        self.cache.pop(key, None)
+        with self.db:
+            if not self.db.execute('DELETE FROM entries WHERE key = ?', (key,)).rowcount:
+                raise KeyError(key)
+    def keys(self):
+        self.flush()
+        for (k,) in self.db.execute('SELECT key FROM entries'):
+            yield k
+    __iter__ = keys
+    def values(self):
+        for _, v in self.items():
+            yield v
+    def items(self):
+        self.flush()
+        for k, v in self.db.execute('SELECT key, value FROM entries'):
+            yield k, pickle.loads(v)
 class MemoBase:
     """
     Subclass this, it's just a context manager.
     """
-    def __init__(self, filename='.%x.cache' % host_id):
+    sqlite_exts = '.sqlite .sqlite3 .db3'.split()
+    def __init__(self, filename='.%x.cache' % host_id, batch_size=1<<12, cache_size=1<<16):
         self.kvs_filename = filename = os.path.expanduser(filename)
-        self.entries = kvs.open(filename)
+        self.stats = collections.Counter(hits=0, misses=0, failures=0)
+        _, ext = os.path.splitext(filename)
+        if ext.lower() in self.sqlite_exts:
+            self.entries = SqliteStore(filename, batch_size=batch_size, cache_size=cache_size)
+        else:
+            self.entries = kvs.open(filename)
+    def sync(self):
+        """
+        Writes pending entries, for long-lived instances.
+        """
+        self.entries.sync()
     def close(self):
         self.entries.close()
     def __enter__(self):
@@ -128,21 +304,48 @@ class TextArgMemo(MemoBase, SquashBase):
             handle=(MyOwnError)
         """
         fname = f.__name__
-        def wrapper(*args, **kwargs):
-            key = [ fname, *args ]
-            if key in self:
-                debug("Cache hit: %s%s", fname, args)
-                return self[key].unbox()
+        def call(args, kwargs={}):
+            """
+            Returns (value, MemoResult to store)
+            """
+            self.stats['misses'] += 1
             try:
                 value = f(*args, **kwargs)
             except handle as e:
+                self.stats['failures'] += 1
                 error("%s%s failed: %s", fname, args, e or '(no message)')
-                self[key] = MemoFail(error_type=type(e), error_args=e.args, expires=expires)
-                return e
+                return e, MemoFail(error_type=type(e), error_args=e.args, expires=expires)
             else:
                 debug("%s%s succeeded", fname, args)
-                self[key] = MemoSuccess(result=value, expires=expires)
-                return value
+                return value, MemoSuccess(result=value, expires=expires)
+        def wrapper(*args, **kwargs):
+            key = [ fname, *args ]
+            mr = self.get(key)
+            if (mr is not None) and not mr.is_expired():
+                debug("Cache hit: %s%s", fname, args)
+                self.stats['hits'] += 1
+                return mr.unbox()
+            value, mr = call(args, kwargs)
+            self[key] = mr
+            return value
+        def many(arg_lists):
+            """
+            Returns [ f(*args) ] for each args in arg_lists, looking them all
+            up at once and storing new results at once
+            """
+            keys = [ [ fname, *args ] for args in arg_lists ]
+            values, updates = [], []
+            for args, key, mr in zip(arg_lists, keys, self.get_many(keys)):
+                if (mr is not None) and not mr.is_expired():
+                    self.stats['hits'] += 1
+                    values.append(mr.unbox())
+                else:
+                    value, mr = call(args)
+                    values.append(value)
+                    updates.append((key, mr))
+            self.set_many(updates)
+            return values
+        wrapper.many = many
         return wrapper
     def describe(self):
         print(len(self), "entries in '%s':" % self.kvs_filename)
@@ -0,0 +1,146 @@
+#! /usr/bin/env python3
+"""
+Resident sorter over a Unix socket, so that small batches do not pay for
+startup, config loading and opening the memo cache every time. Lines are
+tokenized once and kept in memory, in a word_counts.ResidentStore, unless a
+request asks for the on-disk incremental store.
+
+Protocol: the client sends one JSON line of options (format, and keyword
+arguments of sort_urls like order and limit), then the URL lines, then shuts
+down its side. The server answers with one JSON status line, { "ok": true }
+or { "ok": false, "error": ... }, followed by the results in any format of
+url_sort.output, written as they are sorted.
+"""
+import logging
+logger = logging.getLogger(__name__)
+debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger.error, logger.critical
+
+import io
+import itertools
+import json
+import os, os.path
+import socket
+import socketserver
+import stat
+
+from .output import formats, write_urls
+
+
+SOCKET_PATH = '~/.cache/urlsort.sock'
+
+
+class SortRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        from .parser import sort_urls
+        fi = io.TextIOWrapper(self.rfile, encoding='utf-8', errors='replace')
+        line = fi.readline()
+        if not line: # connected and left, like SortServer checking for a live server
+            fi.detach()
+            return
+        fo = io.TextIOWrapper(self.wfile, encoding='utf-8')
+        try:
+            options = json.loads(line)
+            format = options.pop('format', 'm3u')
+            if format not in formats:
+                raise ValueError("format=%s not recognized" % format)
+            if not options.get('incremental'):
+                options['incremental'] = self.server.tokens
+            urls = sort_urls(fi, memo=self.server.memo, **options)
+            # all input is read and sorted before the first url comes out,
+            # so errors are still reported in the status
+            first = next(urls, None)
+        except Exception as e:
+            error("Request failed: %s", e)
+            for _ in fi: # so the client can finish sending
+                pass
+            fo.write(json.dumps({ 'ok': False, 'error': '%s: %s' % (type(e).__name__, e) })+'\n')
+        else:
+            fo.write(json.dumps({ 'ok': True })+'\n')
+            if first is not None:
+                try:
+                    write_urls(itertools.chain([first], urls), fo, format=format)
+                except Exception as e: # too late for the status
+                    error("Request failed while writing results: %s", e)
+            info("%d lines tokenized in memory", len(self.server.tokens.lines))
+        finally:
+            self.server.memo.sync()
+        fo.flush()
+        fo.detach()
+
+
+class SortServer(socketserver.UnixStreamServer):
+    """
+    Requests are handled one at a time, sharing the open memo cache and the
+    tokenized lines. Refuses to start while another server answers on
+    socket_path.
+    """
+    def __init__(self, socket_path=SOCKET_PATH, memo=None, tokens=None):
+        from .word_counts import ResidentStore
+        self.socket_path = socket_path = os.path.expanduser(socket_path)
+        if os.path.lexists(socket_path):
+            if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                raise OSError("'%s' exists and is not a socket" % socket_path)
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(socket_path)
+                except OSError:
+                    warn("Removing stale socket '%s'", socket_path)
+                    os.remove(socket_path)
+                else:
+                    raise OSError("A server is already listening on '%s'" % socket_path)
+        self.memo = memo
+        self.tokens = ResidentStore() if (tokens is None) else tokens
+        umask = os.umask(0o077)
+        try:
+            super().__init__(socket_path, SortRequestHandler)
+        finally:
+            os.umask(umask)
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def serve(socket_path=SOCKET_PATH):
+    from .parser import CACHE_DB
+    from .persistent_cache import TextArgMemo
+    with TextArgMemo(CACHE_DB) as memo:
+        with SortServer(socket_path, memo=memo) as server:
+            info("Listening on '%s'", server.socket_path)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                info("Interrupted")
+
+
+def request(*args, socket_path=SOCKET_PATH, output=None, blocksize=1<<16, **options):
+    """
+    Sends the lines of args (filenames or binary file objects) to a running
+    server, copying the results to output. Returns the server's status.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(os.path.expanduser(socket_path))
+        try:
+            s.sendall(json.dumps(options).encode()+b'\n')
+            for arg in args:
+                f = open(arg, 'rb') if isinstance(arg, str) else arg
+                last = b'\n'
+                try:
+                    for block in iter(lambda: f.read(blocksize), b''):
+                        s.sendall(block)
+                        last = block[-1:]
+                finally:
+                    if f is not arg:
+                        f.close()
+                if last != b'\n':
+                    s.sendall(b'\n')
+            s.shutdown(socket.SHUT_WR)
+        except BrokenPipeError: # the server gave up early, its status says why
+            pass
+        with s.makefile('rb') as fi:
+            status = json.loads(fi.readline())
+            if status.get('ok') and output:
+                for block in iter(lambda: fi.read(blocksize), b''):
+                    output.write(block)
+                output.flush()
+    return status
@@ -0,0 +1,77 @@
+#! /usr/bin/env python3
+"""
+Per-stage wall time and item counts, plus cache statistics.
+
+Stages are timed exclusively: time recorded into other stages while a
+timed() block or timed_iter() is running is subtracted from it, so nested
+and interleaved (generator) stages add up to the total.
+"""
+import collections
+import contextlib
+import json
+import time
+
+
+class Stats:
+    def __init__(self):
+        self.started = time.time()
+        self.stages = collections.OrderedDict()
+        self.caches = collections.OrderedDict()
+        self._recorded = 0.
+    def add(self, stage, seconds=0., count=0):
+        s = self.stages.get(stage)
+        if s is None:
+            s = self.stages[stage] = { 'seconds': 0., 'count': 0 }
+        s['seconds'] += seconds
+        s['count'] += count
+        self._recorded += seconds
+    @contextlib.contextmanager
+    def timed(self, stage, count=0, clock=time.perf_counter):
+        start, recorded = clock(), self._recorded
+        try:
+            yield self
+        finally:
+            elapsed = clock()-start
+            self.add(stage, elapsed-(self._recorded-recorded), count)
+    def timed_iter(self, stage, iterable, count=None, clock=time.perf_counter):
+        """
+        Times each next() of iterable, counting the items, or count(item) for
+        each item if given
+        """
+        it = iter(iterable)
+        while True:
+            start, recorded = clock(), self._recorded
+            try:
+                v = next(it)
+            except StopIteration:
+                self.add(stage, clock()-start-(self._recorded-recorded))
+                return
+            self.add(stage, clock()-start-(self._recorded-recorded), count(v) if count else 1)
+            yield v
+    def timed_call(self, stage, f, clock=time.perf_counter):
+        """
+        Returns a wrapper of f that times and counts each call
+        """
+        def wrapper(*args, **kwargs):
+            start, recorded = clock(), self._recorded
+            try:
+                return f(*args, **kwargs)
+            finally:
+                self.add(stage, clock()-start-(self._recorded-recorded), 1)
+        return wrapper
+    def add_cache(self, name, info):
+        """
+        info is a dict, or the result of an lru_cache's cache_info()
+        """
+        d = info._asdict() if hasattr(info, '_asdict') else dict(info)
+        hits = d.get('hits', 0)
+        lookups = hits+d.get('misses', 0)
+        d['hit_ratio'] = hits/lookups if lookups else None
+        self.caches[name] = d
+    def to_dict(self):
+        return { 'started': self.started, \
+                 'total_seconds': time.time()-self.started, \
+                 'stages': self.stages, \
+                 'caches': self.caches }
+    def dump(self, fo, **kwargs):
+        json.dump(self.to_dict(), fo, **kwargs)
@@ -15,8 +15,18 @@ config = loader.search_config
 
 
 class URLBase:
+    """
+    Records are slotted, so every attribute must be declared in __slots__ of
+    the class that sets it. Subclasses without new attributes should declare
+    __slots__ = ().
+
+    Only the original text is kept; urlparts and the filename fields are
+    derived from it on demand. str() and the filename fields are cached once
+    computed, since sorting and tokenize() read them repeatedly.
+    """
+    __slots__ = '_text _str order date resolutions tags res_score tag_score'.split()
     def __init__(self, arg, order=None, **kwargs):
-        self.resolutions, self.tags = [], []
+        self.resolutions = self.tags = ()
         self.date = None
         self.res_score = self.tag_score = None
         if order is not None:
@@ -26,14 +36,47 @@ class URLBase:
                 self._text = arg
                 self.from_text(arg, **kwargs)
     def update(self, d):
-        self.__dict__.update(d)
+        for k, v in d.items():
+            setattr(self, k, v)
+    def __getstate__(self):
+        state = {}
+        for cls in type(self).__mro__:
+            for k in getattr(cls, '__slots__', ()):
+                if (k not in ('_str', '_fileparts')) and hasattr(self, k):
+                    state[k] = getattr(self, k)
+        return state
+    def __setstate__(self, state):
+        if isinstance(state, tuple): # (__dict__, slots)
+            d, slots = state
+            state = dict(d or {}, **(slots or {}))
+        for k, v in state.items():
+            try:
+                setattr(self, k, v)
+            except AttributeError: # derived attributes pickled by older versions
+                pass
+    def split_url(self, text, urlsplit=urllib.parse.urlsplit):
+        return urlsplit(text)
+    @property
+    def urlparts(self):
+        return self.split_url(self._text)
     def __str__(self, urlunsplit=urllib.parse.urlunsplit):
-        return urlunsplit(self.urlparts)
+        try:
+            return self._str
+        except AttributeError:
+            s = self._str = urlunsplit(self.urlparts)
+            return s
+    @property
+    def key(self):
+        """
+        (netloc, path), which hashing and deduplication compare
+        """
+        return self.urlparts[1:3]
     def __hash__(self):
-        return hash(self.urlparts[1:3])
+        return hash(self.key)
     def __lt__(self, other):
         return str(self) < str(other)
 class URL(URLBase):
+    __slots__ = '_title _fileparts adult ripper'.split()
     _rippers = 'AMIABLE CPG CTG DIAMOND DRONES EVO GECKOS KLEENEX KTR PLAYNOW RARBG ROVER SEXXX SPARKS VBT VSEX XVID YIFY'.split()
     def get_words(self):
         return [ str(_) for _ in self.get_word_groups() ]
@@ -60,7 +103,7 @@ class URL(URLBase):
         """
         assert not self.res_score
         assert not self.tag_score
-        word_groups = []
+        word_groups, all_rs, all_ts = [], [], []
         res_score = tag_score = None
         for wg in self.get_word_groups():
             words = re.split('[^a-zA-Z0-9,!?]+', wg)
@@ -72,12 +115,16 @@ class URL(URLBase):
             x, rs, words = resolutions.replace_terms(words, reducer=max)
             if x:
                 res_score = x if (res_score is None) else max(x, res_score)
-            self.resolutions.extend(rs)
+            all_rs.extend(rs)
             x, ts, words = tag_terms.replace_terms(words)
             if x:
                 tag_score = (tag_score or 0)+x
-            self.tags.extend(ts)
+            all_ts.extend(ts)
             word_groups.extend(w for w in words if w)
+        if all_rs:
+            self.resolutions = (*self.resolutions, *all_rs)
+        if all_ts:
+            self.tags = (*self.tags, *all_ts)
         if not word_groups:
             return []
         last_word = word_groups[-1]
@@ -94,11 +141,20 @@ class URL(URLBase):
             self.title = new_title
         return word_groups
     def from_text(self, text, *args, \
-                remove_remote_pagename=None, \
+                remove_remote_pagename=None):
+        self.split_url(text) # raises ValueError early
+        self._title = None
+    def split_filename(self, \
                 urlsplit=urllib.parse.urlsplit, \
                 unquote=urllib.parse.unquote):
-        parts = self.urlparts = urlsplit(text)
-        _, qfilename = pathsplit(parts.path)
+        """
+        Returns (filepart, ext) of the last path component
+        """
+        try:
+            return self._fileparts
+        except AttributeError:
+            pass
+        _, qfilename = pathsplit(urlsplit(self._text).path)
         filepart = filename = urllib.parse.unquote(qfilename)
         ext = None
         if '.' in filename:
@@ -111,12 +167,38 @@ class URL(URLBase):
                 if i in (-3, -4):
                     filepart = filename[:i]
                     ext = filename[i:]
-        self.title = self.filepart = filepart
-        self.filename, self.ext = filename.replace('/', '-'), ext
+        self._fileparts = filepart, ext
+        return filepart, ext
+    @property
+    def filepart(self):
+        filepart, _ = self.split_filename()
+        return filepart
+    @property
+    def ext(self):
+        _, ext = self.split_filename()
+        return ext
+    @property
+    def title(self):
+        """
+        Defaults to filepart until tokenize() finds something better.
+        """
+        return self.filepart if (self._title is None) else self._title
+    @title.setter
+    def title(self, value):
+        self._title = value
+    @property
+    def filename(self):
+        filepart, ext = self.split_filename()
+        return (filepart+(ext or '')).replace('/', '-')
+    def to_dict(self):
+        return { 'url': str(self), 'title': self.title, \
+                 'date': self.date.isoformat() if self.date else None, \
+                 'tags': list(self.tags), 'resolutions': list(self.resolutions), \
+                 'filename': self.filename, 'order': getattr(self, 'order', None) }
     def to_m3u(self, quote=shlex.quote, sep='\n'):
         lines = []
         y = lines.append
         y( '# %s %s' %(self.title, ('(%d)' % self.date.year) if self.date else '') )
-        y( '# '+quote('/'.join(self.tags+[self.filename]).replace('\0', '_')) )
+        y( '# '+quote('/'.join([*self.tags, self.filename]).replace('\0', '_')) )
         y(str(self))
         return sep.join(lines) if sep else lines
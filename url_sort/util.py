@@ -8,7 +8,6 @@ import re
 import unicodedata
 
 from datetime import datetime, timedelta, timezone
-import dateutil.parser
 
 now = datetime.now(timezone.utc).date()
 current_year = now.year
@@ -90,30 +89,110 @@ def clean_filename(text, dropchars='/;:<>&'):
     return ''.join('-' if (c in dropchars) else c for c in compatible_string(text).replace(' ', '_'))
 
 
-def groupby(iterable, key, factory=None):
+def groupby(iterable, key, factory=None, sort=True):
+    """
+    Returns { key: [ values ] }, list keys being made tuples.
+
+    sort=True orders groups by key, and values within a group by value.
+    sort=False hashes instead, in O(n) and without comparing values: groups
+    are ordered by first appearance, and values keep their input order.
+    """
     def tuplize(arg):
         return tuple(arg) if isinstance(arg, list) else arg
     if factory is None:
         factory = collections.OrderedDict()
+    if not sort:
+        for v in iterable:
+            k = tuplize(key(v))
+            g = factory.get(k)
+            if g is None:
+                factory[k] = [v]
+            else:
+                g.append(v)
+        return factory
     keyed = sorted((key(v), v) for v in iterable)
     for g, kiter in itertools.groupby(keyed, key=lambda row: tuplize(row[0]) ):
         factory[g] = [ v for (k, v) in kiter ]
     return factory
 
+numeric_date_pattern = re.compile('([0-9]{1,4})([-./])([0-9]{1,4})\\2([0-9]{1,4})$')
+def split_numeric_date(text):
+    """
+    Returns three digit strings for the date formats filenames use, like
+    DDMMYY, YYYYMMDD, YYYY.MM.DD and DD-MM-YYYY, or None
+    """
+    if text.isdigit() and text.isascii():
+        if len(text) == 6:
+            return text[:2], text[2:4], text[4:]
+        if len(text) == 8:
+            return text[:4], text[4:6], text[6:]
+        return None
+    m = numeric_date_pattern.match(text)
+    if m:
+        return m.group(1, 3, 4)
+
+def resolve_numeric_date(fields, yearfirst=False, dayfirst=False, \
+        current_year=datetime.now().year):
+    """
+    Orders three digit strings into a date following the rules
+    dateutil.parser uses for all-numeric dates, including its two-digit year
+    window. Raises ValueError for impossible dates, and returns None for
+    ambiguities left to dateutil.
+    """
+    ystridx = None
+    for i, f in enumerate(fields):
+        if 2 < len(f):
+            if ystridx is not None:
+                return None
+            ystridx = i
+    if ystridx == 1:
+        return None
+    a, b, c = (int(f) for f in fields)
+    if (31 < a) or (ystridx == 0) or (yearfirst and (b <= 12) and (c <= 31)):
+        if dayfirst and (c <= 12):
+            year, day, month = a, b, c
+        else:
+            year, month, day = a, b, c
+    elif (12 < a) or (dayfirst and (b <= 12)):
+        day, month, year = a, b, c
+    else:
+        month, day, year = a, b, c
+    if (year < 100) and (ystridx is None):
+        year += current_year//100*100
+        if current_year+50 <= year:
+            year -= 100
+        elif year < current_year-50:
+            year += 100
+    return datetime(year, month, day).date()
+
+def _parse_date(text, parse=None, **kwargs):
+    fields = split_numeric_date(text)
+    if fields:
+        d = resolve_numeric_date(fields, **kwargs)
+        if d is not None:
+            return d
+    if parse is None:
+        import dateutil.parser # slow to import, and rarely needed
+        parse = dateutil.parser.parse
+    return parse(text, **kwargs).date()
+
 @functools.lru_cache(maxsize=1<<10) # Less than 1461 = 4 years
 def parse_date(arg, \
         earliest=datetime(1921, 1, 1).date(), \
         latest=now+timedelta(days=2), \
-        parse=dateutil.parser.parse):
+        parse=_parse_date):
+    """
+    Numeric dates are parsed directly, other strings by dateutil.
+    """
     if (len(arg) == 6) and arg.isdigit():
-        d = parse(arg, dayfirst=True).date()
+        d = parse(arg, dayfirst=True)
         if (earliest < d < latest):
             return d
     t = arg.replace('_', '.')
-    d = parse(t, yearfirst=True).date()
+    d = parse(t, yearfirst=True)
     if (earliest < d < latest):
         return d
-    d = parse(t, dayfirst=True).date()
+    d = parse(t, dayfirst=True)
     if (earliest < d < latest):
         return d
 
@@ -151,7 +230,11 @@ def media_filename_splitter(text):
     st = regex('([1-9]\d{2,}[ _]?[pP])([^a-zA-Z0-9]|$)').sub('\0\\1\0\\2', st)
     return st
 
-def splitter(text):
+def reference_splitter(text):
+    """
+    The original multi-pass splitter, kept as the reference that splitter()
+    is checked against.
+    """
     # stage 0
     st = compatible_string(text)
     if not st:
@@ -172,6 +255,66 @@ def splitter(text):
     # stage 3
     return ts, 3
 
+# The passes of filename_splitter, media_filename_splitter and
+# reference_splitter, compiled once. Each is paired with a literal that must
+# occur for the pattern to match, so that most passes are skipped without a
+# regex scan. The passes depend on each other's output, so they cannot be
+# combined into one alternation without changing results.
+_wrap_passes = [
+        ('[', re.compile('(\[)([^\]]+)(\])'), '\0\\2\0'),
+        ('(', re.compile('([(])([^)]+)([)])'), '\0\\2\0'),
+        ('`', re.compile("([`])([^']+)(['])"), '\0\\2\0'),
+        ]
+_separators = re.compile('[^a-zA-Z0-9,!?]{2,}')
+_extensions = re.compile('([.](AVI|MKV|MP[34]|WMV))([.]|$)')
+_lowercase_start = re.compile('[a-z]{2,}')
+_uppercase_runs = re.compile('([A-Z.]{3,})([^a-zA-Z0-9])')
+_media_passes = [
+        (('3', '4'),    re.compile('(MP[34]|[hHxX]264)', re.IGNORECASE)),
+        (('AAC', 'DD'), re.compile('((AAC|DD_?\d)_?(\d+([.]\d)?)?)')),
+        (('-HD',),      re.compile('([A-Z][a-zA-Z]+-HD)')),
+        (('HD-',),      re.compile('(HD-[A-Z]+)')),
+        ]
+_resolution = re.compile('([1-9]\d{2,}[ _]?[pP])([^a-zA-Z0-9]|$)')
+_numerals = re.compile('([^a-zA-Z\0]{6,})')
+_word_split = re.compile("[^a-zA-Z0-9'’]+")
+
+def splitter(text):
+    """
+    Returns (word groups, stage), identical to reference_splitter but with
+    precompiled, pre-checked passes and no Unicode normalization of ASCII
+    text.
+    """
+    # stage 0
+    st = text if text.isascii() else compatible_string(text)
+    if not st:
+        return [text], 0
+    # stage 1
+    for literal, x, repl in _wrap_passes:
+        if literal in st:
+            st = x.sub(repl, st)
+    st = _separators.sub('\0', st)
+    if ('AVI' in st) or ('MKV' in st) or ('MP' in st) or ('WMV' in st):
+        # NOTE: count=2, as re.IGNORECASE was passed as count originally
+        st = _extensions.sub('\0\\1\0\\2', st, 2)
+    if _lowercase_start.match(st):
+        st = _uppercase_runs.sub('\0\\1\0\\2', st)
+    for literals, x in _media_passes:
+        if any(l in st for l in literals):
+            st = x.sub('\0\\1\0', st)
+    if ('p' in st) or ('P' in st):
+        st = _resolution.sub('\0\\1\0\\2', st)
+    # decimals and numerals of 6 or more
+    st = _numerals.sub('\0\\1\0', st)
+    if '\0' not in st:
+        return [text], 1
+    # stage 2
+    ts = [ _ for _ in (_.strip('._ -') for _ in st.split('\0')) if _ ]
+    if len(ts) <= 1:
+        return _word_split.split(st), 2
+    # stage 3
+    return ts, 3
+
 def get_year_tag(filename_parts):
     """
     Modifies the list filename_parts in-place
@@ -0,0 +1,111 @@
+#! /usr/bin/env python3
+"""
+Stores of tokenized lines, behind incremental sorting and the resident
+server. Word counts are not stored: each run counts the words of its own
+lines, like a full run does.
+"""
+import logging
+logger = logging.getLogger(__name__)
+debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger.error, logger.critical
+
+import collections
+import hashlib
+import os.path
+import pickle
+
+from .persistent_cache import SqliteStore
+
+
+INCREMENTAL_DB = '~/.cache/urlsort-incremental.sqlite'
+
+
+def get_config_stamp():
+    """
+    Returns a digest of the sources of the search config, which tokens
+    depend on
+    """
+    from . import loader
+    return hashlib.md5(repr(loader.get_search_config().stamps).encode()).hexdigest()
+
+
+class IncrementalStore:
+    """
+    Tokenized urls keyed by line, in one SQLite file, so that lines seen in
+    earlier runs are not parsed and tokenized again. The lines are dropped
+    when config_stamp, by default that of the current search config, differs
+    from the one they were tokenized with. Use as a context manager.
+    """
+    def __init__(self, filename=INCREMENTAL_DB, config_stamp=None, **kwargs):
+        self.filename = filename = os.path.expanduser(filename)
+        self.lines = SqliteStore(filename, **kwargs)
+        self.stats = collections.Counter(hits=0, misses=0)
+        self.check_config(get_config_stamp() if (config_stamp is None) else config_stamp)
+    def check_config(self, config_stamp):
+        db = self.lines.db
+        with db:
+            db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID')
+            row = db.execute("SELECT value FROM meta WHERE name = 'config_stamp'").fetchone()
+            if row and (row[0] == config_stamp):
+                return
+            if row:
+                info("Search config changed, dropping the lines tokenized in '%s'", self.filename)
+            db.execute('DELETE FROM entries')
+            db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('config_stamp', ?)", (config_stamp,))
+    def get(self, line):
+        """
+        Returns (tokens, url) or None
+        """
+        try:
+            row = self.lines[line]
+        except KeyError:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return row
+    def get_many(self, lines):
+        """
+        Returns [ (tokens, url) or None ] for lines, in one query
+        """
+        rows = self.lines.get_many(lines)
+        misses = rows.count(None)
+        self.stats['misses'] += misses
+        self.stats['hits'] += len(rows)-misses
+        return rows
+    def add(self, line, tokens, url):
+        self.lines[line] = (tokens, url)
+    def close(self):
+        if self.stats['misses']:
+            info("%d new lines tokenized into '%s'", self.stats['misses'], self.filename)
+        self.lines.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, e_type, e, traceback):
+        self.close()
+class ResidentStore(IncrementalStore):
+    """
+    Like IncrementalStore, in memory, keeping the max_lines most recently
+    used lines. Rows are kept pickled, so that every get() returns new url
+    objects, as reading them from disk does.
+    """
+    def __init__(self, max_lines=1<<20):
+        self.filename = None
+        self.lines = collections.OrderedDict()
+        self.max_lines = max_lines
+        self.stats = collections.Counter(hits=0, misses=0)
+    def get(self, line):
+        data = self.lines.get(line)
+        if data is None:
+            self.stats['misses'] += 1
+            return None
+        self.lines.move_to_end(line)
+        self.stats['hits'] += 1
+        return pickle.loads(data)
+    def get_many(self, lines):
+        return [ self.get(line) for line in lines ]
+    def add(self, line, tokens, url):
+        self.lines[line] = pickle.dumps((tokens, url), pickle.HIGHEST_PROTOCOL)
+        self.lines.move_to_end(line)
+        while self.max_lines < len(self.lines):
+            self.lines.popitem(last=False)
+    def close(self):
+        pass
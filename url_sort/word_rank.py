@@ -5,6 +5,7 @@ debug, info, warn, error, panic = logger.debug, logger.info, logger.warn, logger
 
 import collections
 import math
+import os.path
 
 from .util import *
 
@@ -12,9 +13,72 @@ from .util import *
 def read_wordranks(*args, sep='\n\n', **kwargs):
     contents = []
     y = contents.extend
+    sources = [ os.path.abspath(arg) for arg in args ]
     for arg in expand_dirs(*args):
+        sources.append(os.path.abspath(arg))
         y(open(arg, 'rU').read().split(sep))
-    return WordRanker(contents, **kwargs)
+    w = WordRanker(contents, **kwargs)
+    w.sources = sources
+    return w
+
+
+class CompoundMatcher:
+    """
+    Trie over \0-joined compound tokens, built once. Matches are found in a
+    single left-to-right pass, leftmost-longest and non-overlapping, so the
+    cost depends on the length of the haystack rather than the number of
+    tokens.
+    """
+    def __init__(self, tokens=()):
+        self.root = {}
+        for t in tokens:
+            self.add(t)
+    def add(self, token):
+        node = self.root
+        for c in token:
+            node = node.setdefault(c, {})
+        node[None] = token
+    def __bool__(self):
+        return bool(self.root)
+    def finditer(self, text):
+        """
+        Yields (start, end, token) for each match in text, which should
+        already be lowercase.
+        """
+        root = self.root
+        i, n = 0, len(text)
+        while i < n:
+            node, j, found = root, i, None
+            while j < n:
+                node = node.get(text[j])
+                if node is None:
+                    break
+                j += 1
+                if None in node:
+                    found = j, node[None]
+            if found:
+                end, token = found
+                yield i, end, token
+                i = end
+            else:
+                i += 1
+    def replace(self, text, replacement=''):
+        """
+        Returns (tokens found in order of first appearance, text with all matches replaced)
+        """
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            text = lowered
+        found, parts, last = [], [], 0
+        for start, end, token in self.finditer(lowered):
+            if token not in found:
+                found.append(token)
+            parts.append(text[last:start])
+            last = end
+        if not found:
+            return found, text
+        parts.append(text[last:])
+        return found, replacement.join(parts)
 
 
 class WordRanker:
@@ -22,8 +86,10 @@ class WordRanker:
     From an iterable of iterables, or newline-separated strings.
     """
     tier_sep = '\n'
+    sources = ()
     def __init__(self, arg=None, **kwargs):
         self.ranks = collections.OrderedDict()
+        self.compound_matcher = CompoundMatcher()
         if arg:
             if isinstance(arg, str):
                 tiers = [ line for line in arg.split(self.tier_sep) if line.strip() ]
@@ -50,6 +116,7 @@ class WordRanker:
                 subrank += dsubrank
             rank -= 1
         self.ranks = ranks
+        self.compound_matcher = CompoundMatcher(self.get_compound_tokens())
     def import_tiers(self, tiers, **kwargs):
         tiers = [ t.split() if isinstance(t, str) else t for t in tiers ]
         return self._import_tiers(tiers, **kwargs)
@@ -59,13 +126,9 @@ class WordRanker:
         if normalize is True:
             normalize = self.ntiers
         scores_found, not_found = [], []
-        compound_tokens = self.get_compound_tokens()
-        if compound_tokens:
-            zterms = '\0'.join(terms)
-            for ct in compound_tokens:
-                if ct in zterms.lower():
-                    scores_found.append((compound_tokens[ct], ct))
-                    zterms = case_insensitive_replace(zterms, ct, '')
+        if self.compound_matcher:
+            found, zterms = self.compound_matcher.replace('\0'.join(terms))
+            scores_found.extend((self.ranks[ct], ct) for ct in found)
             terms = [ _.strip() for _ in zterms.split('\0') if _.strip() ]
         for t in terms:
             if (t in self):